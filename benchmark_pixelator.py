@@ -0,0 +1,359 @@
+"""
+Image Pixelator Benchmark
+Times the public load/process/save calls on synthetic images and compares runs against a baseline.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_pixelator import ImagePixelator
+from pixelator_metrics import peak_memory_mb
+from pixelator_patterns import pattern_names
+
+
+PATTERNS = pattern_names()
+# Public calls timed per case; ImagePixelator.metrics gives the finer breakdown
+STAGES = ['load', 'process', 'save']
+# Encoder settings timed on top of the save stage, see ImagePixelator.encode()
+ENCODE_MODES = {
+    'png': ('PNG', {}),
+    'png-fast': ('PNG', {'compress_level': 1}),
+    'png-up': ('PNG', {'png_filter': 'up', 'compress_level': 1}),
+    'png-palette': ('PNG', {'palette': True}),
+    'webp-lossless': ('WEBP', {'lossless': True}),
+    'webp': ('WEBP', {'quality': 90}),
+    'jpeg': ('JPEG', {'quality': 90}),
+}
+
+
+def synthetic_image(megapixels, seed=0):
+    """
+    Build a deterministic photo-like test image.
+    
+    Smooth gradients plus noise, so both the block averages and the encoders
+    see realistic data rather than flat colors or pure noise.
+    
+    Args:
+        megapixels (float): Image size in millions of pixels, 4:3 aspect
+        seed (int): Noise seed
+    
+    Returns:
+        PIL.Image: RGB image
+    """
+    height = max(1, int(round((megapixels * 1e6 * 3 / 4) ** 0.5)))
+    width = max(1, int(round(megapixels * 1e6 / height)))
+    rng = np.random.default_rng(seed)
+    
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    xs = np.linspace(0, 4 * np.pi, width, dtype=np.float32)[None, :]
+    all_ys = np.linspace(0, 3 * np.pi, height, dtype=np.float32)[:, None]
+    # Fill in row bands to keep the float temporaries small on 100 MP images
+    for y in range(0, height, 1024):
+        ys = all_ys[y:y + 1024]
+        shape = (len(ys), width)
+        band = np.stack([
+            (np.sin(xs) + 1) * 100 + ys * 8,
+            np.broadcast_to((np.cos(ys) + 1) * 100, shape),
+            (np.sin(xs + ys) + 1) * 120,
+        ], axis=-1)
+        band += rng.normal(0, 12, band.shape).astype(np.float32)
+        image[y:y + len(ys)] = np.clip(band, 0, 255)
+    return Image.fromarray(image, 'RGB')
+
+
+def _run_pipeline(pixelator, input_path, output_path, output_format):
+    """Load, process and save once through the public API, timing each call."""
+    timings = {}
+    start = time.perf_counter()
+    pixelator.load(input_path)
+    timings['load'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    pixelator.process()
+    timings['process'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    pixelator.save(output_path, output_format)
+    timings['save'] = time.perf_counter() - start
+    return timings
+
+
+def run_case(input_path, block_size, pattern, output_format='PNG', repeat=3, exact=False,
+             encode_modes=(), workers=None):
+    """
+    Time one (image, block size, pattern) combination.
+    
+    load(), process() and save() are timed separately and the fastest of
+    ``repeat`` runs is kept, which filters out scheduler noise. Memory is
+    traced in one extra run afterwards, since tracing slows down allocation.
+    
+    Args:
+        encode_modes: Names from ENCODE_MODES to time after the save stage
+        workers (int): Render processes, None for one per CPU
+    
+    Returns:
+        dict: Stage timings in seconds, the internal stage breakdown of the
+        fastest run from ImagePixelator.metrics, encode seconds and bytes per
+        mode, and peak traced memory in MB
+    """
+    best = {stage: float('inf') for stage in STAGES}
+    best_total = float('inf')
+    breakdown = {}
+    encode = {mode: {'seconds': float('inf'), 'bytes': 0} for mode in encode_modes}
+    output_path = Path(input_path).with_name(f"output.{output_format.lower()}")
+    
+    def new_pixelator():
+        return ImagePixelator(block_size=block_size, pattern=pattern, workers=workers,
+                              verbose=False, exact=exact)
+    
+    for _ in range(repeat):
+        pixelator = new_pixelator()
+        timings = _run_pipeline(pixelator, input_path, output_path, output_format)
+        if sum(timings.values()) < best_total:
+            best_total = sum(timings.values())
+            breakdown = {stage: totals['wall']
+                         for stage, totals in pixelator.metrics.stages.items()}
+        for stage in STAGES:
+            best[stage] = min(best[stage], timings[stage])
+        
+        for mode in encode_modes:
+            fmt, options = ENCODE_MODES[mode]
+            start = time.perf_counter()
+            data = pixelator.encode(fmt, **options)
+            seconds = time.perf_counter() - start
+            encode[mode] = {'seconds': min(encode[mode]['seconds'], seconds), 'bytes': len(data)}
+        del pixelator
+    
+    # Render processes are not traced, so the trace covers this process only
+    tracemalloc.start()
+    try:
+        _run_pipeline(new_pixelator(), input_path, output_path, output_format)
+        peak_traced = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    
+    return {'stages': best, 'breakdown': breakdown, 'encode': encode,
+            'peak_traced_mb': peak_traced / (1024 * 1024)}
+
+
+def run_suite(sizes, block_sizes, patterns, input_format='PNG', output_format='PNG',
+              repeat=3, exact=False, encode_modes=(), workers=None):
+    """
+    Run the full benchmark matrix.
+    
+    Returns:
+        dict: Environment description, one result per case, and the peak
+        RSS of the whole run; RSS is a process-lifetime high-water mark, so
+        per case only the traced peak is reported
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='pixelator-bench-') as tmp:
+        for megapixels in sizes:
+            image = synthetic_image(megapixels)
+            input_path = Path(tmp) / f"input_{megapixels}mp.{input_format.lower()}"
+            image.save(input_path, input_format)
+            width, height = image.size
+            del image
+            
+            for block_size, pattern in itertools.product(block_sizes, patterns):
+                case = run_case(input_path, block_size, pattern, output_format, repeat, exact,
+                                encode_modes, workers)
+                mp = width * height / 1e6
+                total = sum(case['stages'].values())
+                result = {
+                    'megapixels': megapixels,
+                    'width': width,
+                    'height': height,
+                    'block_size': block_size,
+                    'pattern': pattern,
+                    'stages': case['stages'],
+                    'breakdown': case['breakdown'],
+                    'total': total,
+                    'mp_per_s': {stage: mp / seconds if seconds else float('inf')
+                                 for stage, seconds in case['stages'].items()},
+                    'total_mp_per_s': mp / total if total else float('inf'),
+                    'encode': case['encode'],
+                    'peak_traced_mb': case['peak_traced_mb'],
+                    # Traced peak per decoded image byte; PIL's own buffers are not traced
+                    'memory_ratio': case['peak_traced_mb'] * 1024 * 1024 / (width * height * 3),
+                }
+                results.append(result)
+                _print_result(result)
+    
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pillow': Image.__version__,
+            'machine': platform.machine(),
+            'input_format': input_format,
+            'output_format': output_format,
+            'exact': exact,
+            'workers': workers,
+        },
+        'results': results,
+        'peak_rss_mb': peak_memory_mb(),
+    }
+
+
+def _case_key(result):
+    return (result['megapixels'], result['block_size'], result['pattern'])
+
+
+def _print_result(result):
+    stages = '  '.join(f"{stage} {result['mp_per_s'][stage]:8.1f}" for stage in STAGES)
+    print(f"  {result['megapixels']:>5} MP  b={result['block_size']:<3} {result['pattern']:<12} "
+          f"{stages}  total {result['total_mp_per_s']:7.1f} MP/s  "
+          f"peak {result['peak_traced_mb']:7.1f} MB ({result['memory_ratio']:.1f}x image)")
+    if result.get('breakdown'):
+        print("      " + '  '.join(f"{stage} {seconds * 1000:.1f} ms"
+                                   for stage, seconds in result['breakdown'].items()))
+    for mode, encode in result.get('encode', {}).items():
+        print(f"      encode {mode:<14} {encode['seconds'] * 1000:8.1f} ms "
+              f"{encode['bytes'] / 1024:9.0f} KB")
+
+
+def compare(report, baseline, threshold=0.10):
+    """
+    Flag cases and stages that got slower, or cases that need more memory, than the baseline.
+    
+    Args:
+        report (dict): Result of run_suite()
+        baseline (dict): Earlier result of run_suite()
+        threshold (float): Allowed relative slowdown or memory growth, 0.10 means 10%
+    
+    Returns:
+        list: ``(case key, stage, baseline value, current value)`` per regression,
+        in seconds, or in MB for the ``'peak memory'`` stage
+    """
+    previous = {_case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = previous.get(_case_key(result))
+        if old is None:
+            continue
+        for stage in STAGES + ['total']:
+            # Baselines from older versions may lack a stage
+            if stage != 'total' and stage not in old['stages']:
+                continue
+            before = old['total'] if stage == 'total' else old['stages'][stage]
+            after = result['total'] if stage == 'total' else result['stages'][stage]
+            if after > before * (1 + threshold):
+                regressions.append((_case_key(result), stage, before, after))
+        # Encode modes only count when both runs timed them
+        for mode, encode in result.get('encode', {}).items():
+            before = old.get('encode', {}).get(mode, {}).get('seconds')
+            if before is not None and encode['seconds'] > before * (1 + threshold):
+                regressions.append((_case_key(result), f"encode {mode}", before, encode['seconds']))
+        before = old.get('peak_traced_mb')
+        if before is not None and result['peak_traced_mb'] > before * (1 + threshold):
+            regressions.append((_case_key(result), 'peak memory', before, result['peak_traced_mb']))
+    return regressions
+
+
+def memory_overruns(report, max_ratio):
+    """
+    Find cases whose traced peak exceeds ``max_ratio`` times the decoded image size.
+    
+    Returns:
+        list: Results over the limit
+    """
+    return [result for result in report['results'] if result['memory_ratio'] > max_ratio]
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Image Pixelator render pipeline',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark_pixelator.py --save-baseline baseline.json
+  python benchmark_pixelator.py --compare baseline.json --threshold 0.15
+  python benchmark_pixelator.py --sizes 1 25 100 --block-sizes 1 10 100 -p checkerboard
+  python benchmark_pixelator.py --sizes 12 --block-sizes 16 64 --encode-modes png png-up png-palette
+  python benchmark_pixelator.py --sizes 48 --block-sizes 16 -j 1 --max-memory 2
+        """
+    )
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16],
+                        help='Image sizes in megapixels (default: 1 4 16)')
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[1, 8, 32, 100],
+                        help='Block sizes, 1 to 100 like the GUI (default: 1 8 32 100)')
+    parser.add_argument('-p', '--patterns', nargs='+', default=PATTERNS, choices=PATTERNS,
+                        help='Patterns (default: all)')
+    parser.add_argument('--input-format', default='PNG', choices=['PNG', 'JPEG', 'BMP', 'TIFF'],
+                        help='Encoding of the synthetic inputs (default: PNG)')
+    parser.add_argument('--output-format', default='PNG', choices=['PNG', 'JPEG', 'BMP', 'TIFF'],
+                        help='Encoding for the save stage (default: PNG)')
+    parser.add_argument('--encode-modes', nargs='+', default=[], choices=list(ENCODE_MODES),
+                        help='Encoder settings to time and size besides the save stage')
+    parser.add_argument('--exact', action='store_true',
+                        help='Decode JPEG inputs at full resolution')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Render processes (default: one per CPU, like the CLI)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Runs per case, the fastest is kept (default: 3)')
+    parser.add_argument('-o', '--output', help='Write the report as JSON')
+    parser.add_argument('--save-baseline', metavar='PATH',
+                        help='Write the report as the new baseline')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='Compare against a baseline and exit 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown counted as a regression (default: 0.10)')
+    parser.add_argument('--max-memory', type=float, metavar='RATIO',
+                        help='Exit 1 when a case traces more than RATIO times its decoded image size')
+    args = parser.parse_args()
+    
+    print("⏱️  Image Pixelator Benchmark (throughput in MP/s)")
+    print("-" * 50)
+    report = run_suite(args.sizes, args.block_sizes, args.patterns, args.input_format,
+                       args.output_format, args.repeat, args.exact, args.encode_modes,
+                       args.jobs)
+    print("-" * 50)
+    if report['peak_rss_mb'] is not None:
+        print(f"  Peak RSS of the run: {report['peak_rss_mb']:.1f} MB")
+    
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2))
+            print(f"✓ Report saved: {path}")
+    
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"✗ {len(regressions)} regressions over {args.threshold:.0%}:", file=sys.stderr)
+            for (megapixels, block_size, pattern), stage, before, after in regressions:
+                if stage == 'peak memory':
+                    change = f"{before:.1f} MB -> {after:.1f} MB"
+                else:
+                    change = f"{before * 1000:.1f} ms -> {after * 1000:.1f} ms"
+                print(f"  {megapixels} MP b={block_size} {pattern} {stage}: {change}",
+                      file=sys.stderr)
+            sys.exit(1)
+        print(f"✓ No regressions against {args.compare}")
+    
+    if args.max_memory is not None:
+        overruns = memory_overruns(report, args.max_memory)
+        if overruns:
+            print(f"✗ {len(overruns)} cases over {args.max_memory}x the image size:", file=sys.stderr)
+            for result in overruns:
+                print(f"  {result['megapixels']} MP b={result['block_size']} {result['pattern']}: "
+                      f"{result['peak_traced_mb']:.1f} MB ({result['memory_ratio']:.1f}x)",
+                      file=sys.stderr)
+            sys.exit(1)
+        print(f"✓ All cases within {args.max_memory}x the image size")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,10 @@ Image Pixelator GUI Application
 A user-friendly graphical interface for the Image Pixelator tool.
 """
 
+import argparse
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import threading
 import sys
@@ -12,7 +14,14 @@ from PIL import Image, ImageTk
 import io
 
 # Import the pixelator class
-from image_pixelator import ImagePixelator
+from image_pixelator import ImagePixelator, ProcessingCancelled
+from pixelator_patterns import load_pattern_module, pattern_names
+
+
+# Largest preview, in screen pixels
+PREVIEW_SIZE = (480, 320)
+# Quiet time after the last settings change before the preview re-renders
+PREVIEW_DELAY_MS = 120
 
 
 class PixelatorGUI:
@@ -32,9 +41,23 @@ class PixelatorGUI:
         self.pattern = tk.StringVar(value='checkerboard')
         self.is_processing = False
         self.pixelator = None
+        self._cancel_event = threading.Event()
+        
+        # Live preview state: a downscaled copy of the input, decoded once,
+        # and one background worker so renders never overlap
+        self._preview_source = None
+        self._preview_scale = 1.0
+        self._preview_job = None
+        self._preview_future = None
+        self._preview_generation = 0
+        self._preview_executor = ThreadPoolExecutor(max_workers=1,
+                                                    thread_name_prefix='preview')
         
         self._build_gui()
         self._configure_styles()
+        
+        for variable in (self.block_size, self.pattern):
+            variable.trace_add('write', lambda *args: self._schedule_preview())
     
     def _configure_styles(self):
         """Configure ttk styles."""
@@ -94,14 +117,14 @@ class PixelatorGUI:
         # Pattern selection
         ttk.Label(settings_frame, text="Pattern:").grid(row=1, column=0, sticky=tk.W, pady=5)
         pattern_combo = ttk.Combobox(settings_frame, textvariable=self.pattern, width=20,
-                                     values=['checkerboard', 'diagonal', 'horizontal', 'vertical'],
+                                     values=pattern_names(),
                                      state='readonly')
         pattern_combo.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=5)
         
         # Preview checkbox
         self.preview_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(settings_frame, text="Show Preview", variable=self.preview_var,
-                       command=self._update_preview).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=5)
+                       command=self._schedule_preview).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=5)
         
         # --- Preview Section ---
         preview_frame = ttk.LabelFrame(main_frame, text="Preview (Optional)", padding="10")
@@ -130,7 +153,8 @@ class PixelatorGUI:
         self.status_label = ttk.Label(status_frame, text="Ready", foreground='blue')
         self.status_label.grid(row=0, column=0, sticky=tk.W, padx=5)
         
-        self.progress_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=200)
+        self.progress_bar = ttk.Progressbar(status_frame, mode='determinate', maximum=100,
+                                            length=200)
         self.progress_bar.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=5)
         
         # --- Button Section ---
@@ -141,8 +165,11 @@ class PixelatorGUI:
         self.process_button = ttk.Button(button_frame, text="▶ Process Image", command=self._process)
         self.process_button.grid(row=0, column=0, padx=5, sticky=tk.W)
         
-        ttk.Button(button_frame, text="Reset", command=self._reset).grid(row=0, column=1, padx=5)
-        ttk.Button(button_frame, text="Exit", command=self.root.quit).grid(row=0, column=2, padx=5, sticky=tk.E)
+        self.cancel_button = ttk.Button(button_frame, text="■ Cancel", command=self._cancel,
+                                        state='disabled')
+        self.cancel_button.grid(row=0, column=1, padx=5)
+        ttk.Button(button_frame, text="Reset", command=self._reset).grid(row=0, column=2, padx=5)
+        ttk.Button(button_frame, text="Exit", command=self.root.quit).grid(row=0, column=3, padx=5, sticky=tk.E)
     
     def _select_input(self):
         """Select input image file."""
@@ -156,8 +183,7 @@ class PixelatorGUI:
             self.input_path.set(filename)
             self._update_image_info()
             self._set_default_output()
-            if self.preview_var.get():
-                self._update_preview()
+            self._load_preview_source(filename)
     
     def _update_image_info(self):
         """Update image information display."""
@@ -193,8 +219,45 @@ class PixelatorGUI:
         if filename:
             self.output_path.set(filename)
     
+    def _load_preview_source(self, path):
+        """Decode a downscaled copy of the input once, in the background."""
+        self._preview_source = None
+        self._preview_generation += 1
+        generation = self._preview_generation
+        
+        def load():
+            img = Image.open(path)
+            width = img.width
+            # thumbnail() lets JPEGs decode at 1/2, 1/4 or 1/8 scale directly
+            img.thumbnail(PREVIEW_SIZE, Image.Resampling.BOX)
+            return img.convert('RGB'), width / img.width
+        
+        future = self._preview_executor.submit(load)
+        future.add_done_callback(
+            lambda done: self.root.after(0, self._preview_source_loaded, generation, done))
+    
+    def _preview_source_loaded(self, generation, future):
+        """Keep the decoded preview copy and render it (main thread)."""
+        if generation != self._preview_generation:
+            return
+        try:
+            self._preview_source, self._preview_scale = future.result()
+        except Exception as e:
+            self.preview_label.config(image='', text=f"Error loading preview: {str(e)}",
+                                     foreground='red')
+            return
+        if self.preview_var.get():
+            self._update_preview()
+    
+    def _schedule_preview(self):
+        """Re-render the preview once the settings stop changing."""
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(PREVIEW_DELAY_MS, self._update_preview)
+    
     def _update_preview(self):
-        """Update preview image."""
+        """Start rendering the pixelated preview on the background worker."""
+        self._preview_job = None
         if not self.preview_var.get():
             self.preview_label.config(image='', text="Preview disabled")
             return
@@ -204,26 +267,53 @@ class PixelatorGUI:
                                      foreground='gray')
             return
         
+        if self._preview_source is None:
+            # Still decoding; _preview_source_loaded() renders when done
+            self.preview_label.config(image='', text="Loading preview...", foreground='gray')
+            return
+        
         try:
-            self.status_label.config(text="Loading preview...", foreground='blue')
-            self.root.update()
-            
-            img = Image.open(self.input_path.get())
-            
-            # Resize for preview
-            max_size = (250, 300)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage
-            photo = ImageTk.PhotoImage(img)
-            self.preview_label.config(image=photo, text='')
-            self.preview_label.image = photo  # Keep a reference
-            
-            self.status_label.config(text="Ready", foreground='blue')
+            block_size = self.block_size.get()
+            pattern = self.pattern.get()
+        except tk.TclError:
+            # Spinbox holds a partial entry such as ''
+            return
+        
+        # Blocks shrink with the image so the preview shows the final look
+        preview_block = max(1, round(block_size / self._preview_scale))
+        
+        # A render still waiting for the worker is stale now
+        if self._preview_future is not None:
+            self._preview_future.cancel()
+        self._preview_generation += 1
+        generation = self._preview_generation
+        source = self._preview_source
+        
+        def render():
+            pixelator = ImagePixelator(block_size=preview_block, pattern=pattern, verbose=False)
+            return pixelator.pixelate(source)
+        
+        self._preview_future = self._preview_executor.submit(render)
+        self._preview_future.add_done_callback(
+            lambda done: self.root.after(0, self._show_preview, generation, done))
+    
+    def _show_preview(self, generation, future):
+        """Display a finished preview render unless newer settings superseded it."""
+        if generation != self._preview_generation or future.cancelled():
+            return
+        try:
+            img = future.result()
         except Exception as e:
-            self.preview_label.config(image='', text=f"Error loading preview: {str(e)}",
+            self.preview_label.config(image='', text=f"Error rendering preview: {str(e)}",
                                      foreground='red')
-            self.status_label.config(text=f"Error: {str(e)}", foreground='red')
+            return
+        if not self.preview_var.get():
+            return
+        
+        # Convert to PhotoImage
+        photo = ImageTk.PhotoImage(img)
+        self.preview_label.config(image=photo, text='')
+        self.preview_label.image = photo  # Keep a reference
     
     def _process(self):
         """Process the image."""
@@ -242,43 +332,56 @@ class PixelatorGUI:
         
         # Disable button and start processing
         self.process_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
         self.is_processing = True
-        self.progress_bar.start()
+        self._cancel_event.clear()
+        self.progress_bar['value'] = 0
         self.status_label.config(text="Processing...", foreground='orange')
-        self.root.update()
         
-        # Run in thread to prevent freezing
-        thread = threading.Thread(target=self._process_thread)
+        # Run in thread to prevent freezing; Tk variables are read here
+        thread = threading.Thread(target=self._process_thread,
+                                  args=(self.input_path.get(), self.output_path.get(),
+                                        self.block_size.get(), self.pattern.get()))
         thread.start()
     
-    def _process_thread(self):
+    def _process_thread(self, input_path, output_path, block_size, pattern):
         """Run processing in background thread."""
         try:
             # Create pixelator and process
-            pixelator = ImagePixelator(
-                block_size=self.block_size.get(),
-                pattern=self.pattern.get()
-            )
-            pixelator.load_image(self.input_path.get())
-            pixelator.process()
-            pixelator.save(self.output_path.get())
+            pixelator = ImagePixelator(block_size=block_size, pattern=pattern, verbose=False)
+            pixelator.load(input_path)
+            pixelator.process(progress=self._report_progress, cancel=self._cancel_event)
+            pixelator.output.save(output_path)
             
             # Update UI in main thread
             self.root.after(0, self._process_complete, True, "Image processed successfully!")
+        except ProcessingCancelled:
+            self.root.after(0, self._process_complete, False, None)
         except Exception as e:
             self.root.after(0, self._process_complete, False, str(e))
     
+    def _report_progress(self, done, total):
+        """Progress callback from the processing thread."""
+        self.root.after(0, self.progress_bar.config, {'value': done * 100 / total})
+    
+    def _cancel(self):
+        """Ask the running render to stop at its next band."""
+        self._cancel_event.set()
+        self.cancel_button.config(state='disabled')
+        self.status_label.config(text="Cancelling...", foreground='orange')
+    
     def _process_complete(self, success, message):
-        """Called when processing completes."""
-        self.progress_bar.stop()
+        """Called when processing completes; message is None after a cancel."""
         self.process_button.config(state='normal')
+        self.cancel_button.config(state='disabled')
         self.is_processing = False
         
-        if success:
+        if message is None:
+            self.progress_bar['value'] = 0
+            self.status_label.config(text="Cancelled", foreground='blue')
+        elif success:
             self.status_label.config(text="✓ Complete!", foreground='green')
             messagebox.showinfo("Success", message)
-            if self.preview_var.get():
-                self._update_preview()
         else:
             self.status_label.config(text="✗ Error", foreground='red')
             messagebox.showerror("Error", f"Processing failed:\n{message}")
@@ -290,6 +393,8 @@ class PixelatorGUI:
         self.block_size.set(10)
         self.pattern.set('checkerboard')
         self.preview_var.set(False)
+        self._preview_source = None
+        self._preview_generation += 1
         self.info_label.config(text="No image selected", foreground='gray')
         self.preview_label.config(image='', text="Enable preview and select an image to see a preview",
                                  foreground='gray')
@@ -298,9 +403,34 @@ class PixelatorGUI:
 
 def main():
     """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description='Graphical interface for the Image Pixelator',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python gui_pixelator.py
+  python gui_pixelator.py --pattern-module my_patterns.py
+        """
+    )
+    parser.add_argument('--pattern-module', action='append', default=[], metavar='SOURCE',
+                        help='Python file or module name registering extra patterns, '
+                             'imported before the pattern list is built (repeatable)')
+    args = parser.parse_args()
+    
+    for source in args.pattern_module:
+        try:
+            load_pattern_module(source)
+        except Exception as e:
+            print(f"✗ Error loading pattern module {source}: {e}", file=sys.stderr)
+            sys.exit(1)
+    
     root = tk.Tk()
     app = PixelatorGUI(root)
     root.mainloop()
+    # Drop a render still queued (shutdown's cancel_futures needs Python 3.9)
+    if app._preview_future is not None:
+        app._preview_future.cancel()
+    app._preview_executor.shutdown(wait=False)
 
 
 if __name__ == '__main__':
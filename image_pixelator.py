@@ -5,39 +5,513 @@ Perfect for creating artistic, retro-looking images with binary patterns.
 """
 
 import argparse
+import cProfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import lru_cache, reduce
+import glob
+import io
+import json
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import os
 from pathlib import Path
-import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
+import struct
 import sys
+import time
+import zlib
+
+from pixelator_cache import ResultCache, image_digest
+from pixelator_io import (ANIMATED_IMAGE_EXTENSIONS, PNG_FILTERS, STREAM_WRITERS, VECTOR_EXTENSIONS,
+                          VECTOR_WRITERS, VIDEO_CODECS, VIDEO_EXTENSIONS, PngStreamWriter,
+                          animation_writer, is_animation, read_bands, read_frames, vector_rects)
+from pixelator_metrics import PixelatorMetrics
+from pixelator_patterns import (MASK_SIZE, load_pattern_module, pattern_key, pattern_mask,
+                                pattern_names, register_pattern)
+
+
+GRID_EXTENSION = '.pxg'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif', '.webp', '.ppm')
+
+# Distinct (pattern mask, block_size) layouts kept by the pattern map cache;
+# maps are at most 4 * 14 * 14 bytes whatever the block size, so 50 KB in all
+PATTERN_CACHE_SIZE = 64
+
+# Images below this many pixels render in-process; starting a process pool
+# costs about as much as rendering 1-2 MP serially
+PARALLEL_MIN_PIXELS = 2_000_000
+
+# Approximate rows rendered between progress reports and cancellation checks
+PROGRESS_BAND_HEIGHT = 256
+
+# Pixels summed per pass by _block_sums, which bounds its temporary copies
+BLOCK_SUM_CHUNK_PIXELS = 1 << 18
+
+# Where a pixel takes its color from, see _block_source_maps.
+# LEFT and UP are bit flags so that LEFT + UP == UP_LEFT.
+_SOURCE_OWN, _SOURCE_LEFT, _SOURCE_UP, _SOURCE_UP_LEFT, _SOURCE_WHITE = range(5)
+
+
+class PixelatorError(Exception):
+    """Base class for errors raised by ImagePixelator."""
+
+
+class InvalidSettingError(PixelatorError, ValueError):
+    """A constructor argument such as the pattern or block size is invalid."""
+
+
+class ImageDecodeError(PixelatorError):
+    """The input could not be read as an image."""
+
+
+class ImageEncodeError(PixelatorError):
+    """The output could not be encoded."""
+
+
+class ProcessingCancelled(PixelatorError):
+    """A cancellation token was set while processing."""
+
+
+def _check_cancelled(cancel):
+    """Raise ProcessingCancelled once the cancellation token is set."""
+    if cancel is not None and cancel.is_set():
+        raise ProcessingCancelled("Processing cancelled")
+
+
+def _block_sums(values, block_size):
+    """
+    Sum an array of shape (height, width, channels) over square blocks.
+    
+    reduceat handles the ragged right/bottom blocks for free. Applied to a
+    grid of block sums it yields the sums of blocks ``block_size`` times
+    larger, which is exact because the ragged edges nest as well.
+    
+    reduceat casts its whole input to the accumulator type first, so rows
+    are summed in chunks of about BLOCK_SUM_CHUNK_PIXELS pixels, and in
+    uint32 when a block of uint8 values cannot overflow it (block_size up
+    to 4104).
+    
+    Returns:
+        np.ndarray: uint32 array of shape (blocks_y, blocks_x, channels) for
+        such uint8 input, uint64 otherwise
+    """
+    height, width = values.shape[:2]
+    if values.dtype == np.uint8 and 255 * block_size * block_size < 2 ** 32:
+        dtype = np.uint32
+    else:
+        dtype = np.uint64
+    cols = np.arange(0, width, block_size)
+    rows_per_chunk = max(1, BLOCK_SUM_CHUNK_PIXELS // max(1, width))
+    sums = np.zeros((-(-height // block_size), len(cols)) + values.shape[2:], dtype=dtype)
+    
+    top = 0
+    while top < height:
+        if rows_per_chunk >= block_size:
+            # Whole block rows
+            bottom = min(height, top + rows_per_chunk // block_size * block_size)
+        else:
+            # Part of one block row, added to its sums
+            bottom = min(height, top + rows_per_chunk, (top // block_size + 1) * block_size)
+        chunk = values[top:bottom]
+        partial = np.add.reduceat(chunk, np.arange(0, len(chunk), block_size), axis=0, dtype=dtype)
+        first = top // block_size
+        sums[first:first + len(partial)] += np.add.reduceat(partial, cols, axis=1)
+        top = bottom
+    return sums
+
+
+def _averages_from_sums(sums, height, width, block_size):
+    """Turn block sums of a height x width image into uint8 block averages."""
+    rows = np.diff(np.append(np.arange(0, height, block_size), height))
+    cols = np.diff(np.append(np.arange(0, width, block_size), width))
+    counts = (rows[:, None] * cols[None, :]).astype(np.float32)
+    
+    # Same float32 division and truncation as _get_block_average_color
+    averages = sums.astype(np.float32)
+    averages /= counts[:, :, None]
+    return averages.astype(np.uint8)
+
+
+def _summed_area_table(pixels):
+    """Integral image with a leading row and column of zeros, as uint64."""
+    height, width = pixels.shape[:2]
+    table = np.zeros((height + 1, width + 1, 3), dtype=np.uint64)
+    np.cumsum(pixels, axis=0, dtype=np.uint64, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def _table_block_sums(table, block_size):
+    """Block sums read from a summed-area table, four lookups per block."""
+    height, width = table.shape[0] - 1, table.shape[1] - 1
+    ys = np.append(np.arange(0, height, block_size), height)
+    xs = np.append(np.arange(0, width, block_size), width)
+    corners = table[ys][:, xs]
+    return (corners[1:, 1:] + corners[:-1, :-1]) - (corners[:-1, 1:] + corners[1:, :-1])
+
+
+def _pyramid_sums(pixels, block_sizes):
+    """
+    Block sums for several block sizes from a single pass over the pixels.
+    
+    The pixels are summed once at the greatest common divisor of the sizes
+    and every size is then summed from the finest grid that nests into it,
+    e.g. 4 -> 8 -> 16 -> 32. When the sizes share no divisor, a summed-area
+    table of the image (24 bytes per pixel) serves the ones that do not nest.
+    
+    Returns:
+        dict: uint32 or uint64 block sums per block size
+    """
+    # math.gcd() takes more than two arguments only from Python 3.9
+    base = reduce(math.gcd, block_sizes)
+    grids = {}
+    table = None
+    if base > 1:
+        grids[base] = _block_sums(pixels, base)
+    elif 1 in block_sizes:
+        grids[1] = pixels
+    
+    for block_size in sorted(block_sizes):
+        divisors = [size for size in grids if block_size % size == 0]
+        if divisors:
+            finest = max(divisors)
+            if finest != block_size:
+                grids[block_size] = _block_sums(grids[finest], block_size // finest)
+        else:
+            if table is None:
+                table = _summed_area_table(pixels)
+            grids[block_size] = _table_block_sums(table, block_size)
+    return {block_size: grids[block_size] for block_size in block_sizes}
+
+
+def _image_pixels(image):
+    """
+    Copy an RGB image into a uint8 array of shape (height, width, 3).
+    
+    np.asarray() goes through Image.tobytes(), which joins the encoded
+    chunks into a second full-size copy; copying bands of
+    PROGRESS_BAND_HEIGHT rows keeps the peak at the array plus one band.
+    """
+    width, height = image.size
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    for y in range(0, height, PROGRESS_BAND_HEIGHT):
+        y2 = min(y + PROGRESS_BAND_HEIGHT, height)
+        pixels[y:y2] = np.asarray(image.crop((0, y, width, y2)))
+    return pixels
+
+
+def _block_palette(averages):
+    """Flatten a grid of block colors into a palette with white (255) appended last."""
+    channels = averages.shape[-1]
+    return np.concatenate([averages.reshape(-1, channels),
+                           np.full((1, channels), 255, dtype=np.uint8)])
+
+
+def _pattern_pixel(pattern, x, y):
+    """
+    Get pattern value for a cell coordinate; works elementwise on arrays.
+    
+    Returns:
+        bool: True for "1", False for "0"
+    """
+    return pattern_mask(pattern)[y, x]
+
+
+def _block_source_maps(pattern, block_size):
+    """_compiled_source_maps() for a registered pattern name."""
+    return _compiled_source_maps(pattern_mask(pattern).tobytes(), block_size)
+
+
+def _cell_classes(positions, block_size):
+    """
+    Index the rows or columns of _compiled_source_maps() by pixel position.
+    
+    Within a block, a pixel row (or column) only matters through its cell
+    and whether it is the first of that cell, so the maps store one entry
+    per such class: ``2 * cell + (not first)``.
+    
+    Returns:
+        np.ndarray: Class of every position, in the same shape
+    """
+    cell_size = max(1, block_size // 4)
+    local = positions % block_size
+    return 2 * (local // cell_size) + (local % cell_size != 0)
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _compiled_source_maps(mask_bytes, block_size):
+    """
+    Build the per-block compositing maps used by the array renderer.
+    
+    The reference renderer draws every "1" cell with ``ImageDraw.rectangle``,
+    whose corners are inclusive, so each cell also paints one pixel column to
+    its right and one pixel row below it. Because cell indices restart at every
+    block origin, the resulting picture is periodic in ``block_size``: for each
+    pixel of a block we can precompute which block's color ends up there.
+    
+    The maps hold one entry per row and column class of _cell_classes()
+    rather than per pixel, so their size does not grow with block_size.
+    They are cached per (pattern mask, block_size) across images and
+    pixelator instances, with LRU eviction beyond ``PATTERN_CACHE_SIZE``
+    entries. Keying on the mask rather than the name means a re-registered
+    pattern never reuses stale maps.
+    Clipped right/bottom edge blocks use the same maps, since cell positions
+    always count from the block origin.
+    
+    Returns:
+        np.ndarray: int8 array of shape (4, classes, classes), at most
+        (4, 14, 14), indexed by ``has_left + 2 * has_up`` and the row and
+        column classes. Values are ``_SOURCE_OWN``, ``_SOURCE_LEFT``,
+        ``_SOURCE_UP``, ``_SOURCE_UP_LEFT`` or ``_SOURCE_WHITE``.
+    """
+    pattern = np.frombuffer(mask_bytes, dtype=bool).reshape(MASK_SIZE, MASK_SIZE)
+    cell_size = max(1, block_size // 4)
+    cells = (block_size - 1) // cell_size + 1
+    classes = np.arange(2 * cells)
+    cell = classes // 2
+    first = classes % 2 == 0
+    # The block origin is the first pixel of cell 0
+    origin = classes == 0
+    # Cell that bleeds into a first-of-cell pixel; at the block origin it is
+    # the last cell of the neighboring block.
+    prev_cell = np.where(origin, cells - 1, cell - 1)
+    
+    shape = (len(classes), len(classes))
+    own = pattern[cell[:, None], cell[None, :]]
+    left = first[None, :] & pattern[cell[:, None], prev_cell[None, :]]
+    up = first[:, None] & pattern[prev_cell[:, None], cell[None, :]]
+    up_left = first[None, :] & first[:, None] & pattern[prev_cell[:, None], prev_cell[None, :]]
+    
+    # Whether a bleeding cell lives in the neighboring block
+    from_left_block = np.broadcast_to(origin[None, :], shape)
+    from_up_block = np.broadcast_to(origin[:, None], shape)
+    
+    maps = np.empty((4,) + shape, dtype=np.int8)
+    for has_up in (False, True):
+        for has_left in (False, True):
+            left_ok = left & (has_left | ~from_left_block)
+            up_ok = up & (has_up | ~from_up_block)
+            up_left_ok = up_left & (has_left | ~from_left_block) & (has_up | ~from_up_block)
+            
+            # Paint in the order the reference renderer draws: the upper-left
+            # cell is always drawn first, cells of the block above are drawn
+            # before cells of the current block row, and within a block the
+            # upper cell of the same column comes after the left cell.
+            winner = np.full(shape, _SOURCE_WHITE, dtype=np.int8)
+            winner[up_left_ok] = _SOURCE_UP_LEFT
+            winner[up_ok & from_up_block] = _SOURCE_UP
+            winner[left_ok] = _SOURCE_LEFT
+            winner[up_ok & ~from_up_block] = _SOURCE_UP
+            winner[own] = _SOURCE_OWN
+            
+            # A winning neighbor cell may still belong to the current block
+            shift_x = np.isin(winner, (_SOURCE_LEFT, _SOURCE_UP_LEFT)) & from_left_block
+            shift_y = np.isin(winner, (_SOURCE_UP, _SOURCE_UP_LEFT)) & from_up_block
+            source = np.where(winner == _SOURCE_WHITE, _SOURCE_WHITE,
+                              shift_x * _SOURCE_LEFT + shift_y * _SOURCE_UP)
+            maps[int(has_left) + 2 * int(has_up)] = source
+    
+    # Shared between callers through the cache, so keep it immutable
+    maps.setflags(write=False)
+    return maps
 
 
 class ImagePixelator:
     """Convert images to pixelated blocks with binary (1/0) patterns."""
     
-    def __init__(self, block_size=10, pattern='checkerboard'):
+    def __init__(self, block_size=10, pattern='checkerboard', workers=None, verbose=True,
+                 result_cache=None, average_cache=None, exact=False, draft_min_block=4,
+                 log=None):
         """
         Initialize the pixelator.
         
         Args:
             block_size (int): Size of each pixel block in pixels
-            pattern (str): Pattern type ('checkerboard', 'diagonal', 'horizontal')
+            pattern (str): Pattern name, one of pattern_names()
+            workers (int): Number of processes rendering strips, and of
+                threads compressing PNG output, in parallel; None (the
+                default) for one per CPU. Images smaller than
+                PARALLEL_MIN_PIXELS always render and encode in-process.
+                Render processes are started without forking the caller,
+                so scripts need an ``if __name__ == '__main__':`` guard.
+            verbose (bool): Print progress messages when no log callable is given
+            result_cache (ResultCache): Optional on-disk cache of encoded results
+            average_cache (AverageGridCache): Optional in-memory cache of block
+                average grids, reused when only the pattern changes
+            exact (bool): Always decode at full resolution. Otherwise JPEGs are
+                decoded downscaled by 2, 4 or 8 when block_size allows it.
+            draft_min_block (int): Smallest block side, in decoded pixels,
+                allowed when decoding downscaled. At 4, block sizes from 8
+                up are decoded downscaled. The error against an exact decode
+                mostly depends on the block size in source pixels: smooth
+                photos stay within 2-4 levels, while noise and fine texture
+                reach about 10 levels at block size 8, 8 at 16, 4 at 32 and
+                2 from 64. Use exact=True when that matters.
+            log: Callable receiving progress messages instead of print,
+                e.g. ``logging.getLogger(__name__).info``
+        
+        Raises:
+            InvalidSettingError: If the pattern or block size is invalid
         """
         self.block_size = block_size
         self.pattern = pattern.lower()
-        self.valid_patterns = ['checkerboard', 'diagonal', 'horizontal', 'vertical']
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.verbose = verbose
+        self.log = log or (print if verbose else None)
+        self.result_cache = result_cache
+        self.average_cache = average_cache
+        self.exact = exact
+        self.draft_min_block = draft_min_block
+        self._digest = (None, None)
+        # (image, scale, full size) when self.image was decoded downscaled
+        self._draft = (None, 1, None)
+        # (output, averages) of the last sequential process(), for palette encoding
+        self._output_grid = (None, None)
+        self.metrics = PixelatorMetrics()
+        self.image = None
+        self.output = None
         
-        if self.pattern not in self.valid_patterns:
-            raise ValueError(f"Invalid pattern. Choose from: {', '.join(self.valid_patterns)}")
+        if self.pattern not in pattern_names():
+            raise InvalidSettingError(
+                f"Invalid pattern. Choose from: {', '.join(pattern_names())}")
+        if self.block_size < 1:
+            raise InvalidSettingError("Block size must be at least 1")
+    
+    @property
+    def valid_patterns(self):
+        """Names of the registered patterns, built-ins first."""
+        return pattern_names()
+    
+    def _require_image(self):
+        """Raise PixelatorError unless an image has been loaded."""
+        if self.image is None:
+            raise PixelatorError("No image loaded, call load() first")
+    
+    def _log(self, message):
+        """Pass a progress message to the log callable, if any."""
+        if self.log:
+            self.log(message)
+    
+    def _open_image(self, source):
+        """
+        Decode an image, downscaled when only block averages are needed.
+        
+        JPEG decoders can scale by 1/2, 1/4 or 1/8 while decoding (PIL draft
+        mode), which is far cheaper in time and memory. That scale is used
+        when it divides block_size and both image sides, and leaves blocks,
+        including the ragged ones at the edges, of at least draft_min_block
+        pixels; averages are then taken over the smaller blocks of the
+        reduced image. They are close to but not exactly those of a full
+        decode, see draft_min_block in __init__.
+        
+        Args:
+            source: Image path or binary file-like object
+        
+        Returns:
+            PIL.Image: The decoded RGB image, possibly downscaled
+        """
+        with self.metrics.stage('load'):
+            self.image = self._decode(source)
+        self.metrics.count('bytes_decoded', self.image.width * self.image.height * 3)
+        return self.image
+    
+    def _decode(self, source):
+        """Decode for _open_image() and record the draft scale used."""
+        image = Image.open(source)
+        width, height = image.size
+        scale = 1
+        if not self.exact and image.format == 'JPEG':
+            # The narrowest blocks are the ragged ones at the right and bottom
+            narrowest = min(self.block_size, width % self.block_size or self.block_size,
+                            height % self.block_size or self.block_size)
+            for candidate in (8, 4, 2):
+                # A ragged last row or column of decoded pixels stands for
+                # fewer source pixels but would count as a full one, which
+                # skews the edge blocks; only scales dividing both sides are used
+                if (self.block_size % candidate == 0
+                        and width % candidate == 0 and height % candidate == 0
+                        and narrowest // candidate >= self.draft_min_block):
+                    image.draft('RGB', (width // candidate, height // candidate))
+                    scale = candidate
+                    break
+            # The decoder may settle on another scale; only trust the exact one
+            expected = (width // scale, height // scale)
+            if scale > 1 and image.size != expected:
+                if hasattr(source, 'seek'):
+                    source.seek(0)
+                image = Image.open(source)
+                scale = 1
+        
+        # convert() copies even an RGB image, doubling the peak of the decode
+        if image.mode == 'RGB':
+            image.load()
+        else:
+            image = image.convert('RGB')
+        self._draft = (image, scale, (width, height))
+        return image
+    
+    def _source_geometry(self):
+        """
+        Returns:
+            tuple: ``(scale, (width, height))`` of the loaded image, where
+            scale is the downscaling factor applied while decoding
+        """
+        image, scale, size = self._draft
+        if image is not self.image:
+            return 1, self.image.size
+        return scale, size
+    
+    def load(self, source):
+        """
+        Load an image from memory or a file without printing or exiting.
+        
+        Args:
+            source: Path, bytes-like object, binary file-like object, PIL
+                image, or uint8 NumPy array of shape (height, width),
+                (height, width, 3) or (height, width, 4)
+        
+        Returns:
+            PIL.Image: The loaded RGB image, possibly downscaled (see _open_image)
+        
+        Raises:
+            ImageDecodeError: If source cannot be read as an image
+        """
+        if isinstance(source, np.ndarray):
+            if source.dtype != np.uint8 or source.ndim not in (2, 3):
+                raise ImageDecodeError(
+                    f"Expected a uint8 array of shape (height, width[, channels]), "
+                    f"got {source.dtype} {source.shape}")
+            try:
+                source = Image.fromarray(source)
+            except (TypeError, ValueError) as e:
+                raise ImageDecodeError(f"Unsupported array shape {source.shape}: {e}") from e
+        
+        if isinstance(source, Image.Image):
+            with self.metrics.stage('load'):
+                self.image = source.convert('RGB')
+            self.metrics.count('bytes_decoded', self.image.width * self.image.height * 3)
+            return self.image
+        
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        try:
+            return self._open_image(source)
+        except Exception as e:
+            raise ImageDecodeError(f"Could not read image: {e}") from e
     
     def load_image(self, image_path):
-        """Load an image from file."""
+        """Load an image from file, exiting on errors (CLI use)."""
         try:
-            self.image = Image.open(image_path).convert('RGB')
-            print(f"✓ Image loaded: {image_path}")
-            print(f"  Size: {self.image.width}x{self.image.height}")
+            self.load(image_path)
+            scale, (width, height) = self._source_geometry()
+            self._log(f"✓ Image loaded: {image_path}")
+            self._log(f"  Size: {width}x{height}"
+                      + (f" (decoded at 1/{scale})" if scale > 1 else ""))
             return self.image
-        except Exception as e:
+        except PixelatorError as e:
             print(f"✗ Error loading image: {e}", file=sys.stderr)
             sys.exit(1)
     
@@ -48,15 +522,7 @@ class ImagePixelator:
         Returns:
             bool: True for "1", False for "0"
         """
-        if self.pattern == 'checkerboard':
-            return (x + y) % 2 == 0
-        elif self.pattern == 'diagonal':
-            return (x - y) % 2 == 0
-        elif self.pattern == 'horizontal':
-            return y % 2 == 0
-        elif self.pattern == 'vertical':
-            return x % 2 == 0
-        return True
+        return _pattern_pixel(self.pattern, x, y)
     
     def _get_block_average_color(self, x1, y1, x2, y2):
         """Calculate average color of a block."""
@@ -90,8 +556,338 @@ class ImagePixelator:
                     )
                 # "0" is represented by empty space (background shows through)
     
-    def process(self):
-        """Process the image and create pixelated version."""
+    def _block_averages(self, pixels, block_size=None):
+        """
+        Calculate the average color of every block in one pass.
+        
+        Args:
+            pixels: uint8 array of shape (height, width, 3)
+            block_size (int): Block size in ``pixels``, defaults to
+                self.block_size
+        
+        Returns:
+            np.ndarray: uint8 array of shape (blocks_y, blocks_x, 3)
+        """
+        block_size = block_size or self.block_size
+        if block_size == 1:
+            # Every pixel is its own block; skip the full-size sum and float grids
+            return np.array(pixels)
+        height, width = pixels.shape[:2]
+        return _averages_from_sums(_block_sums(pixels, block_size), height, width, block_size)
+    
+    def _cached_block_averages(self, pixels):
+        """_block_averages() for the loaded image, going through the average cache."""
+        # A downscaled decode has proportionally smaller blocks
+        scale, _ = self._source_geometry()
+        with self.metrics.stage('average'):
+            if self.average_cache is None:
+                averages = self._block_averages(pixels, self.block_size // scale)
+            else:
+                digest = self._image_digest()
+                averages = self.average_cache.get(digest, self.block_size)
+                if averages is None:
+                    averages = self._block_averages(pixels, self.block_size // scale)
+                    self.average_cache.put(digest, self.block_size, averages)
+        self.metrics.count('blocks', averages.shape[0] * averages.shape[1])
+        return averages
+    
+    def _render_rows(self, averages, width, y1, y2, first_block_row=0):
+        """
+        Render output rows ``y1:y2`` from a grid of block averages.
+        
+        Args:
+            averages: uint8 array of shape (blocks_y, blocks_x, 3). It only needs
+                to cover the block rows of ``y1:y2`` plus the block row above.
+            width (int): Output width in pixels
+            y1, y2: Row range to render
+            first_block_row (int): Block row that ``averages[0]`` belongs to
+        
+        Returns:
+            np.ndarray: uint8 array of shape (y2 - y1, width, 3)
+        """
+        return self._row_renderer(averages, width, first_block_row)(y1, y2)
+    
+    def _row_renderer(self, averages, width, first_block_row=0):
+        """
+        Prepare _render_rows() for one grid, to render it band by band.
+        
+        The palette and the source maps are built once here rather than
+        per band, so banded rendering costs the same as a single call.
+        
+        Returns:
+            callable: ``render(y1, y2)`` returning a uint8 array of shape
+            (y2 - y1, width, channels)
+        """
+        palette = _block_palette(averages)
+        maps = _block_source_maps(self.pattern, self.block_size)
+        blocks_x = averages.shape[1]
+        
+        def render(y1, y2):
+            return palette[self._palette_index(blocks_x, width, y1, y2, first_block_row,
+                                               maps=maps)]
+        return render
+    
+    def _palette_index(self, blocks_x, width, y1, y2, first_block_row=0, x1=0, maps=None):
+        """
+        Map output pixels ``y1:y2, x1:width`` to entries of _block_palette().
+        
+        The mapping only depends on the geometry, so it can be reused for
+        any number of average grids of the same shape.
+        
+        Args:
+            maps: _block_source_maps() of this pattern and block size, looked
+                up when not given
+        
+        Returns:
+            np.ndarray: int32 array of shape (y2 - y1, width - x1); white is -1
+        """
+        if maps is None:
+            maps = _block_source_maps(self.pattern, self.block_size)
+        
+        ys = np.arange(y1, y2)
+        xs = np.arange(x1, width)
+        block_y = (ys // self.block_size).astype(np.int32)
+        block_x = (xs // self.block_size).astype(np.int32)
+        variant = (2 * (block_y > 0)).astype(np.int8)[:, None] + (block_x > 0)[None, :]
+        source = maps[variant, _cell_classes(ys, self.block_size)[:, None],
+                      _cell_classes(xs, self.block_size)[None, :]]
+        
+        offsets = np.array([0, -1, -blocks_x, -blocks_x - 1, 0], dtype=np.int32)
+        index = (block_y - first_block_row)[:, None] * blocks_x + block_x[None, :] + offsets[source]
+        index[source == _SOURCE_WHITE] = -1
+        return index
+    
+    def process(self, progress=None, cancel=None):
+        """
+        Process the image and create pixelated version.
+        
+        Args:
+            progress: Optional callable taking ``(rows_done, total_rows)``,
+                called after every band of about PROGRESS_BAND_HEIGHT rows
+            cancel: Optional cancellation token such as threading.Event,
+                checked between bands
+        
+        Raises:
+            PixelatorError: If no image has been loaded
+            ProcessingCancelled: If cancel was set before rendering finished
+        """
+        self._require_image()
+        scale, (width, height) = self._source_geometry()
+        
+        # Parallel workers average their own full-size strips, bypassing the
+        # cache; a downscaled decode is small enough to average in place
+        _check_cancelled(cancel)
+        if (self.workers > 1 and height > self.block_size
+                and width * height >= PARALLEL_MIN_PIXELS
+                and self.average_cache is None and scale == 1):
+            with self.metrics.stage('render_parallel'):
+                output_image = self._render_parallel(self.image, progress, cancel)
+            self.metrics.count('blocks', -(-height // self.block_size) * -(-width // self.block_size))
+        else:
+            averages = self._cached_block_averages(_image_pixels(self.image))
+            rows_per_band = max(1, PROGRESS_BAND_HEIGHT // self.block_size) * self.block_size
+            # Bands go straight into the output image, without a full-size
+            # array next to it
+            output_image = Image.new('RGB', (width, height))
+            render = self._row_renderer(averages, width)
+            for y in range(0, height, rows_per_band):
+                _check_cancelled(cancel)
+                y2 = min(y + rows_per_band, height)
+                with self.metrics.stage('fill'):
+                    output_image.paste(Image.fromarray(render(y, y2), 'RGB'), (0, y))
+                if progress:
+                    progress(y2, height)
+            self._output_grid = (output_image, averages)
+        self.metrics.count('pixels', width * height)
+        
+        self.output = output_image
+        self._log(f"✓ Processing complete with pattern: {self.pattern}")
+        return output_image
+    
+    def compute_grid(self):
+        """
+        Reduce the loaded image to its grid of block averages.
+        
+        Returns:
+            PixelGrid: Compact intermediate that can be stored and rendered
+            later without the source image
+        
+        Raises:
+            PixelatorError: If no image has been loaded
+        """
+        self._require_image()
+        averages = self._cached_block_averages(_image_pixels(self.image))
+        _, (width, height) = self._source_geometry()
+        return PixelGrid(averages, width, height, self.block_size, self.pattern)
+    
+    def iter_pyramid(self, block_sizes, patterns=None):
+        """
+        Render the loaded image at several block sizes and patterns in one pass.
+        
+        Averages for all sizes come from a single pass over the pixels (see
+        _pyramid_sums) and match separate runs exactly, so the cost is
+        dominated by the one decode and the rendering of each variant.
+        
+        Args:
+            block_sizes: Block sizes in pixels of the original image
+            patterns: Pattern names, defaults to self.pattern
+        
+        Yields:
+            tuple: ``(block_size, pattern, image)`` for every combination
+        
+        Raises:
+            InvalidSettingError: If a size or pattern is invalid, or a size
+                is not a multiple of the scale the image was decoded at
+            PixelatorError: If no image has been loaded
+        """
+        self._require_image()
+        block_sizes = sorted(set(block_sizes))
+        # Validates every size and pattern before any work is done
+        variants = [[ImagePixelator(block_size=size, pattern=pattern, verbose=False)
+                     for pattern in patterns or [self.pattern]] for size in block_sizes]
+        scale, (width, height) = self._source_geometry()
+        for size in block_sizes:
+            if size % scale:
+                raise InvalidSettingError(
+                    f"Block size {size} is not a multiple of the decode scale {scale}, "
+                    "load with exact=True")
+        
+        pixels = _image_pixels(self.image)
+        with self.metrics.stage('average'):
+            grids = _pyramid_sums(pixels, [size // scale for size in block_sizes])
+        for size, pixelators in zip(block_sizes, variants):
+            averages = _averages_from_sums(grids[size // scale], pixels.shape[0],
+                                           pixels.shape[1], size // scale)
+            self.metrics.count('blocks', averages.shape[0] * averages.shape[1])
+            for variant in pixelators:
+                with self.metrics.stage('fill'):
+                    rows = variant._render_rows(averages, width, 0, height)
+                self.metrics.count('pixels', width * height)
+                yield size, variant.pattern, Image.fromarray(rows, 'RGB')
+    
+    def iter_bands(self, band_height=512):
+        """
+        Render the loaded image lazily, one band of rows at a time.
+        
+        Args:
+            band_height (int): Approximate rows per band, rounded to a
+                multiple of block_size
+        
+        Yields:
+            tuple: ``(y, rows)`` with ``rows`` a uint8 array of shape
+            (band rows, width, 3)
+        
+        Raises:
+            PixelatorError: If no image has been loaded
+        """
+        self._require_image()
+        _, (width, height) = self._source_geometry()
+        rows_per_band = max(1, band_height // self.block_size) * self.block_size
+        render = self._row_renderer(self._cached_block_averages(_image_pixels(self.image)), width)
+        for y in range(0, height, rows_per_band):
+            with self.metrics.stage('fill'):
+                rows = render(y, min(y + rows_per_band, height))
+            self.metrics.count('pixels', rows.shape[0] * width)
+            yield y, rows
+    
+    def write_png(self, target, band_height=512, compress_level=6):
+        """
+        Render the loaded image straight into a PNG, band by band.
+        
+        The full-size output is never materialized, so the first bytes
+        are available before the last rows are rendered.
+        
+        Args:
+            target: Output path or binary file-like object
+            band_height (int): Approximate rows rendered per step
+            compress_level (int): zlib compression level (0-9)
+        
+        Raises:
+            PixelatorError: If no image has been loaded
+        """
+        self._require_image()
+        _, (width, height) = self._source_geometry()
+        with PngStreamWriter(target, width, height, compress_level) as writer:
+            for _, rows in self.iter_bands(band_height):
+                with self.metrics.stage('save'):
+                    writer.write(rows)
+        self.metrics.count('bytes_encoded', writer.bytes_written)
+    
+    def _render_parallel(self, image, progress=None, cancel=None):
+        """
+        Render the image in block-aligned strips on a pool of processes.
+        
+        Source and destination pixels live in shared memory, so only strip
+        coordinates are sent to the workers. The source is copied in and the
+        result out band by band, without other full-size arrays.
+        
+        Args:
+            image: RGB image to render
+            progress: Optional callable taking ``(rows_done, total_rows)``,
+                called as strips finish
+            cancel: Optional cancellation token; strips not yet started are
+                dropped once it is set
+        
+        Returns:
+            PIL.Image: The rendered RGB image
+        """
+        width, height = image.size
+        shape = (height, width, 3)
+        nbytes = width * height * 3
+        # Strips as tall as process()'s bands, so progress and cancellation
+        # are as fine-grained as in-process rendering
+        rows_per_strip = max(1, PROGRESS_BAND_HEIGHT // self.block_size) * self.block_size
+        
+        source_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        target_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            source = np.ndarray(shape, dtype=np.uint8, buffer=source_shm.buf)
+            target = np.ndarray(shape, dtype=np.uint8, buffer=target_shm.buf)
+            for y in range(0, height, PROGRESS_BAND_HEIGHT):
+                y2 = min(y + PROGRESS_BAND_HEIGHT, height)
+                source[y:y2] = np.asarray(image.crop((0, y, width, y2)))
+            
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     mp_context=_pool_context()) as executor:
+                futures = {
+                    executor.submit(_render_strip, self.block_size, self.pattern,
+                                    pattern_mask(self.pattern), shape,
+                                    source_shm.name, target_shm.name, y, min(y + rows_per_strip, height)):
+                    min(rows_per_strip, height - y)
+                    for y in range(0, height, rows_per_strip)
+                }
+                rows_done = 0
+                for future in as_completed(futures):
+                    future.result()
+                    rows_done += futures[future]
+                    if progress:
+                        progress(rows_done, height)
+                    if cancel is not None and cancel.is_set():
+                        # Drop the strips not started yet; leaving the with
+                        # block waits for the running ones
+                        for pending in futures:
+                            pending.cancel()
+                        _check_cancelled(cancel)
+            
+            output = Image.new('RGB', (width, height))
+            for y in range(0, height, PROGRESS_BAND_HEIGHT):
+                output.paste(Image.fromarray(target[y:y + PROGRESS_BAND_HEIGHT], 'RGB'), (0, y))
+            del source, target
+            return output
+        finally:
+            source_shm.close()
+            source_shm.unlink()
+            target_shm.close()
+            target_shm.unlink()
+    
+    def process_reference(self):
+        """
+        Process the image block by block with ImageDraw.
+        
+        This is the original renderer, kept as the reference implementation that
+        process() must match byte for byte. It needs a full-resolution image,
+        so load with ``exact=True`` when comparing.
+        """
         output_image = Image.new('RGB', self.image.size, color='white')
         draw = ImageDraw.Draw(output_image)
         
@@ -110,21 +906,456 @@ class ImagePixelator:
                 self._fill_block_with_pattern(draw, x, y, x2, y2, color)
         
         self.output = output_image
-        print(f"✓ Processing complete with pattern: {self.pattern}")
+        self._log(f"✓ Processing complete with pattern: {self.pattern}")
         return output_image
     
-    def save(self, output_path):
-        """Save the processed image."""
+    def process_stream(self, input_path, output_path, band_height=512, progress=None,
+                       cancel=None):
+        """
+        Pixelate an image band by band without holding it in memory.
+        
+        The input is read in horizontal bands of ``band_height`` rows (rounded
+        to a multiple of ``block_size``) and every rendered band is encoded to
+        the output right away, so peak memory depends on the band height and
+        not on the image size. Uncompressed inputs (PPM, BMP, TIFF) are read
+        straight from the file and deflate or PackBits TIFFs one strip or tile
+        at a time. Other formats (PNG, JPEG, LZW TIFF) are decoded whole by
+        PIL first, so for them memory is only bounded to about one decoded
+        image plus one band; a warning is logged.
+        
+        Args:
+            input_path: Input image path
+            output_path: Output image path, must end in .png or .ppm
+            band_height (int): Approximate number of rows held in memory
+            progress: Optional callable taking ``(rows_done, total_rows)``,
+                called after every band
+            cancel: Optional cancellation token such as threading.Event,
+                checked between bands
+        
+        Raises:
+            ProcessingCancelled: If cancel was set; the partial output is removed
+        """
+        rows_per_band = max(1, band_height // self.block_size) * self.block_size
+        suffix = Path(output_path).suffix.lower()
+        if suffix not in STREAM_WRITERS:
+            raise ValueError(f"Streaming output must be one of: {', '.join(STREAM_WRITERS)}")
+        
+        (width, height), bands, bounded = read_bands(input_path, rows_per_band)
+        self._log(f"✓ Streaming image: {input_path}")
+        self._log(f"  Size: {width}x{height}, {rows_per_band} rows per band")
+        if not bounded:
+            self._log(f"⚠️  {Path(input_path).suffix or input_path} input is decoded whole, "
+                      "so memory is not bounded by the band height; use PPM, BMP or an "
+                      "uncompressed, deflate or PackBits TIFF")
+        
+        previous = None
+        try:
+            with STREAM_WRITERS[suffix](output_path, width, height) as writer:
+                while True:
+                    _check_cancelled(cancel)
+                    with self.metrics.stage('load'):
+                        y, band = next(bands, (None, None))
+                    if band is None:
+                        break
+                    self.metrics.count('bytes_decoded', band.nbytes)
+                    
+                    with self.metrics.stage('average'):
+                        averages = self._block_averages(band)
+                    self.metrics.count('blocks', averages.shape[0] * averages.shape[1])
+                    first_block_row = y // self.block_size
+                    if previous is not None:
+                        # The top row of a band can be painted by the block row above
+                        averages = np.concatenate([previous, averages])
+                        first_block_row -= 1
+                    with self.metrics.stage('fill'):
+                        rows = self._render_rows(averages, width, y, y + len(band), first_block_row)
+                    with self.metrics.stage('save'):
+                        writer.write(rows)
+                    self.metrics.count('pixels', rows.shape[0] * width)
+                    previous = averages[-1:]
+                    if progress:
+                        progress(y + len(band), height)
+        except ProcessingCancelled:
+            Path(output_path).unlink(missing_ok=True)
+            raise
+        self.metrics.count('bytes_encoded', writer.bytes_written)
+        
+        self._log(f"✓ Processing complete with pattern: {self.pattern}")
+        self._log(f"✓ Image saved: {output_path}")
+    
+    def process_animation(self, input_path, output_path, progress=None, cancel=None):
+        """
+        Pixelate every frame of an animated image or a video.
+        
+        Frames are decoded, rendered and written one at a time, so memory does
+        not grow with the clip length. Only blocks whose color, or the color
+        of a neighbor bleeding into them, differs from the previous frame are
+        re-rendered, so mostly static footage costs little more than
+        averaging each frame. Animated WebP is the exception: PIL's encoder
+        collects all frames before writing.
+        
+        Args:
+            input_path: Animated GIF/WebP/PNG or video file
+            output_path: Output path ending in .gif, .webp, .png or .apng for an
+                animated image, or in .mp4, .mov, .avi or .mkv for a video.
+                Any other image format gets the first frame only.
+            progress: Optional callable taking ``(frames_done, total_frames)``
+            cancel: Optional cancellation token, checked between frames
+        
+        Returns:
+            int: Number of frames written
+        
+        Raises:
+            ProcessingCancelled: If cancel was set; nothing is written
+        """
+        suffix = Path(output_path).suffix.lower()
+        total, frames = read_frames(input_path)
+        if suffix not in ANIMATED_IMAGE_EXTENSIONS and suffix not in VIDEO_CODECS:
+            return self._process_first_frame(frames, input_path, output_path, cancel)
+        self._log(f"✓ Animation loaded: {input_path}"
+                  + (f" ({total} frames)" if total else ""))
+        
+        writer = None
+        output = previous = index = None
+        count = reused = 0
+        try:
+            with ExitStack() as stack:
+                while True:
+                    _check_cancelled(cancel)
+                    with self.metrics.stage('load'):
+                        pixels, duration = next(frames, (None, None))
+                    if pixels is None:
+                        break
+                    self.metrics.count('bytes_decoded', pixels.nbytes)
+                    
+                    with self.metrics.stage('average'):
+                        averages = self._block_averages(pixels)
+                    self.metrics.count('blocks', averages.shape[0] * averages.shape[1])
+                    with self.metrics.stage('fill'):
+                        if output is None:
+                            height, width = pixels.shape[:2]
+                            # The pixel-to-block mapping is the same for every frame
+                            index = self._palette_index(averages.shape[1], width, 0, height)
+                            output = _block_palette(averages)[index]
+                        else:
+                            reused += self._update_changed_blocks(output, index, averages, previous)
+                    self.metrics.count('pixels', pixels.shape[0] * pixels.shape[1])
+                    previous = averages
+                    
+                    with self.metrics.stage('save'):
+                        if writer is None:
+                            writer = stack.enter_context(
+                                animation_writer(output_path, width, height, duration))
+                        writer.write(output, duration)
+                    count += 1
+                    if progress and total:
+                        progress(min(count, total), total)
+                
+                if count == 0:
+                    raise ValueError(f"No frames found in {input_path}")
+                # Closing the writer finishes the file
+                with self.metrics.stage('save'):
+                    stack.close()
+        except BaseException:
+            # Nothing, not even a partial animation, is left behind
+            Path(output_path).unlink(missing_ok=True)
+            raise
+        finally:
+            frames.close()
+        self.metrics.count('bytes_encoded', os.path.getsize(output_path))
+        self.output = Image.fromarray(output, 'RGB')
+        
+        blocks = (count - 1) * previous.shape[0] * previous.shape[1]
+        self._log(f"✓ {count} frames processed with pattern: {self.pattern}"
+                  + (f", {reused / blocks:.0%} of blocks reused" if blocks else ""))
+        self._log(f"✓ Animation saved: {output_path}")
+        return count
+    
+    def _process_first_frame(self, frames, input_path, output_path, cancel=None):
+        """process_animation() for a still output: pixelate the first frame only."""
+        try:
+            suffix = Path(output_path).suffix.lower()
+            if suffix not in Image.registered_extensions() and suffix not in VECTOR_EXTENSIONS:
+                raise ValueError("Animation output must be one of: "
+                                 f"{', '.join(ANIMATED_IMAGE_EXTENSIONS + tuple(VIDEO_CODECS))}, "
+                                 "or a still image format for the first frame")
+            pixels, _ = next(frames, (None, None))
+        finally:
+            frames.close()
+        if pixels is None:
+            raise ValueError(f"No frames found in {input_path}")
+        self._log(f"⚠️  {suffix} is a still format, pixelating the first frame only")
+        self.load(pixels)
+        self.process(cancel=cancel)
+        if suffix in VECTOR_EXTENSIONS:
+            self.save_vector(output_path)
+        else:
+            self._write_output(output_path)
+        self._log(f"✓ Image saved: {output_path}")
+        return 1
+    
+    def _update_changed_blocks(self, output, index, averages, previous):
+        """
+        Re-render the blocks of output affected by a new grid of averages.
+        
+        Args:
+            output: Rendered previous frame, updated in place
+            index: Result of _palette_index() for the whole frame
+            averages: Block averages of the new frame
+            previous: Block averages output was rendered from
+        
+        Returns:
+            int: Number of blocks left untouched
+        """
+        changed = np.any(averages != previous, axis=2)
+        # A block's pattern also paints into its right, lower and lower-right neighbors
+        spread = changed.copy()
+        spread[:, 1:] |= changed[:, :-1]
+        dirty = spread.copy()
+        dirty[1:] |= spread[:-1]
+        
+        rows = np.flatnonzero(dirty.any(axis=1))
+        if len(rows) == 0:
+            return dirty.size
+        palette = _block_palette(averages)
+        # Re-render each run of dirty block rows across its dirty column span
+        for run in np.split(rows, np.flatnonzero(np.diff(rows) > 1) + 1):
+            columns = np.flatnonzero(dirty[run[0]:run[-1] + 1].any(axis=0))
+            y1, y2 = run[0] * self.block_size, (run[-1] + 1) * self.block_size
+            x1, x2 = columns[0] * self.block_size, (columns[-1] + 1) * self.block_size
+            output[y1:y2, x1:x2] = palette[index[y1:y2, x1:x2]]
+        return dirty.size - int(np.count_nonzero(dirty))
+    
+    def _image_digest(self):
+        """Content hash of the loaded image, computed once per image."""
+        image, digest = self._digest
+        if image is not self.image:
+            digest = image_digest(_image_pixels(self.image))
+            scale, _ = self._source_geometry()
+            if scale > 1:
+                # Averages of a downscaled decode differ from exact ones
+                digest = f"{digest}d{scale}"
+            self._digest = (self.image, digest)
+        return digest
+    
+    def _result_key(self, output_path, fmt=None, options=None):
+        """Result cache key for writing the current settings to output_path."""
+        suffix = Path(output_path).suffix.lower()
+        fmt = fmt or Image.registered_extensions().get(suffix)
+        if fmt is None:
+            raise ValueError(f"Unknown image format: {suffix or output_path}")
+        # Different encode options give different files
+        variant = fmt + ''.join(f"-{name}={value}" for name, value in sorted((options or {}).items()))
+        return fmt, ResultCache.key(self._image_digest(), self.block_size,
+                                    pattern_key(self.pattern), variant)
+    
+    def save_from_cache(self, output_path, fmt=None, **options):
+        """
+        Write a previously cached result for the loaded image, if there is one.
+        
+        Args:
+            output_path: Output path
+            fmt, **options: Encode settings of the result, see encode()
+        
+        Returns:
+            bool: True if output_path was written from the result cache
+        """
+        if self.result_cache is None:
+            return False
+        _, key = self._result_key(output_path, fmt, options)
+        data = self.result_cache.get(key)
+        if data is None:
+            return False
+        with self.metrics.stage('save'):
+            Path(output_path).write_bytes(data)
+        self.metrics.count('bytes_encoded', len(data))
+        self._log(f"✓ Image saved from cache: {output_path}")
+        return True
+    
+    def _write_output(self, output_path, fmt=None, **options):
+        """Encode the output to output_path, filling the result cache."""
+        fmt = fmt or Image.registered_extensions().get(Path(output_path).suffix.lower())
+        with self.metrics.stage('save'):
+            if self.result_cache is None:
+                self._encode(output_path, fmt, options)
+            else:
+                fmt, key = self._result_key(output_path, fmt, options)
+                buffer = io.BytesIO()
+                self._encode(buffer, fmt, options)
+                Path(output_path).write_bytes(buffer.getvalue())
+                self.result_cache.put(key, buffer.getvalue())
+        self.metrics.count('bytes_encoded', os.path.getsize(output_path))
+    
+    def _indexed_output(self):
+        """
+        Render the output as palette indices instead of RGB.
+        
+        The output has at most one color per block plus white, so the palette
+        comes from the small average grid rather than from the pixels, and
+        rendering a grid of indices gives the indexed image directly. Index
+        255 is reserved for white.
+        
+        Returns:
+            tuple: ``(palette, bands)`` where palette is a uint8 array of shape
+            (256, 3) and bands yields uint8 index rows of shape (n, width), or
+            None when there are more than 255 block colors
+        """
+        scale, (width, height) = self._source_geometry()
+        output, averages = self._output_grid
+        if output is not self.output:
+            averages = self._block_averages(_image_pixels(self.image), self.block_size // scale)
+        colors, ids = np.unique(averages.reshape(-1, 3), axis=0, return_inverse=True)
+        if len(colors) > 255:
+            return None
+        palette = np.full((256, 3), 255, dtype=np.uint8)
+        palette[:len(colors)] = colors
+        ids = ids.astype(np.uint8).reshape(averages.shape[0], averages.shape[1], 1)
+        
+        def bands():
+            render = self._row_renderer(ids, width)
+            for y in range(0, height, PROGRESS_BAND_HEIGHT):
+                yield render(y, min(y + PROGRESS_BAND_HEIGHT, height))[:, :, 0]
+        
+        return palette, bands()
+    
+    def _encode(self, target, fmt, options):
+        """Encode the output to a path or binary file object, see encode()."""
+        options = {name: value for name, value in options.items() if value is not None}
+        png_filter = options.pop('png_filter', None)
+        palette = options.pop('palette', False)
+        if fmt != 'PNG' and (png_filter or palette):
+            raise InvalidSettingError("png_filter and palette only apply to PNG output")
+        if png_filter and png_filter not in PNG_FILTERS:
+            raise InvalidSettingError(f"PNG filter must be one of: {', '.join(PNG_FILTERS)}")
+        width, height = self.output.size
+        # Large PNGs are compressed band by band on all workers
+        workers = self.workers if width * height >= PARALLEL_MIN_PIXELS else 1
+        parallel = fmt == 'PNG' and workers > 1 and set(options) <= {'compress_level'}
+        if not (png_filter or palette or parallel):
+            self.output.save(target, fmt, **options)
+            return
+        
+        # Filters, palettes and parallel compression go through the built-in encoder
+        indexed = self._indexed_output() if palette else None
+        if palette and indexed is None:
+            # Quantizing would be lossy and about 12x slower than RGB
+            self._log("⚠️  More than 255 block colors, writing an RGB PNG instead of a palette")
+        if indexed:
+            colors, bands = indexed
+        else:
+            colors = None
+            bands = (np.asarray(self.output.crop((0, y, width, min(y + PROGRESS_BAND_HEIGHT, height))))
+                     for y in range(0, height, PROGRESS_BAND_HEIGHT))
+        # Without a filter given, palettes take none and RGB a per-row choice
+        with PngStreamWriter(target, width, height, options.get('compress_level', 6),
+                              png_filter or ('none' if indexed else None), colors,
+                              workers) as writer:
+            for rows in bands:
+                writer.write(rows)
+    
+    def encode(self, fmt='PNG', **options):
+        """
+        Encode the processed image into memory.
+        
+        Args:
+            fmt (str): PIL format name such as 'PNG', 'JPEG' or 'WEBP'
+            **options: Encoder options. Besides anything PIL accepts:
+                compress_level (int): PNG zlib level 0-9; 1 is several times
+                    faster than the default 6 on large outputs
+                png_filter (str): PNG row filter, one of PNG_FILTERS; 'up'
+                    suits the repeating rows of pixelated images
+                quality (int): JPEG/WebP quality 1-100
+                lossless (bool): Lossless WebP
+                palette (bool): Write an 8-bit palette PNG. Images with more
+                    than 255 block colors are written as RGB instead.
+        
+        Returns:
+            bytes: The encoded image
+        
+        Raises:
+            PixelatorError: If nothing has been processed yet
+            InvalidSettingError: If an option such as png_filter is invalid
+            ImageEncodeError: If the image cannot be encoded in this format
+        """
+        if self.output is None:
+            raise PixelatorError("Nothing to encode, call process() first")
+        buffer = io.BytesIO()
         try:
-            self.output.save(output_path)
-            print(f"✓ Image saved: {output_path}")
+            with self.metrics.stage('save'):
+                self._encode(buffer, fmt, options)
+        except InvalidSettingError:
+            raise
+        except Exception as e:
+            raise ImageEncodeError(f"Could not encode {fmt}: {e}") from e
+        data = buffer.getvalue()
+        self.metrics.count('bytes_encoded', len(data))
+        return data
+    
+    def pixelate(self, source, fmt=None, **params):
+        """
+        Load, process and optionally encode in one call, with no disk I/O
+        for in-memory sources.
+        
+        Args:
+            source: Anything load() accepts
+            fmt (str): None to return a PIL image, 'array' for a uint8 NumPy
+                array, or a PIL format name such as 'PNG' for encoded bytes
+            **params: Encoder options, see encode()
+        
+        Returns:
+            PIL.Image, numpy.ndarray or bytes, depending on fmt
+        
+        Raises:
+            PixelatorError: On any decode, processing or encode failure
+        """
+        self.load(source)
+        output = self.process()
+        if fmt is None:
+            return output
+        if fmt == 'array':
+            return np.asarray(output)
+        return self.encode(fmt, **params)
+    
+    def save_vector(self, output_path, scale=1.0):
+        """
+        Write the loaded image as an SVG or PDF document.
+        
+        Only the block averages are needed, so process() does not have to
+        run first. See PixelGrid.save_vector() for the format.
+        
+        Args:
+            output_path: Output path ending in .svg or .pdf
+            scale (float): Document units per source pixel
+        
+        Raises:
+            PixelatorError: If no image has been loaded
+        """
+        self._require_image()
+        grid = self.compute_grid()
+        with self.metrics.stage('save'):
+            grid.save_vector(output_path, scale)
+        self.metrics.count('bytes_encoded', os.path.getsize(output_path))
+        self._log(f"✓ Vector image saved: {output_path}")
+    
+    def save(self, output_path, fmt=None, **options):
+        """
+        Save the processed image, exiting on errors (CLI use).
+        
+        Args:
+            output_path: Output path
+            fmt (str): PIL format name, defaults to the one of the extension
+            **options: Encoder options, see encode()
+        """
+        try:
+            self._write_output(output_path, fmt, **options)
+            self._log(f"✓ Image saved: {output_path}")
         except Exception as e:
             print(f"✗ Error saving image: {e}", file=sys.stderr)
             sys.exit(1)
     
     def show_info(self):
         """Display information about the processing."""
-        width, height = self.image.size
+        _, (width, height) = self._source_geometry()
         blocks_x = (width + self.block_size - 1) // self.block_size
         blocks_y = (height + self.block_size - 1) // self.block_size
         
@@ -135,8 +1366,353 @@ class ImagePixelator:
         print()
 
 
+class PixelGrid:
+    """
+    Block averages of an image plus the metadata needed to render it.
+    
+    The grid is all the information in a pixelated image; the full-size
+    canvas is only its expansion with a pattern. A grid is roughly
+    ``block_size ** 2`` times smaller than the rendered RGB image.
+    """
+    
+    MAGIC = b'PXGRID1\n'
+    
+    def __init__(self, averages, width, height, block_size, pattern='checkerboard'):
+        """
+        Initialize the grid.
+        
+        Args:
+            averages: uint8 array of shape (blocks_y, blocks_x, 3)
+            width, height: Size of the source image in pixels
+            block_size (int): Block size the averages were taken with
+            pattern (str): Default pattern for rendering
+        """
+        self.averages = np.ascontiguousarray(averages, dtype=np.uint8)
+        self.width = width
+        self.height = height
+        self.block_size = block_size
+        self.pattern = pattern
+        
+        expected = ((height + block_size - 1) // block_size,
+                    (width + block_size - 1) // block_size, 3)
+        if self.averages.shape != expected:
+            raise ValueError(f"Grid shape {self.averages.shape} does not match "
+                             f"{width}x{height} with block size {block_size}")
+    
+    def to_bytes(self):
+        """Serialize to a small header followed by the zlib-compressed grid."""
+        header = json.dumps({
+            'width': self.width,
+            'height': self.height,
+            'block_size': self.block_size,
+            'pattern': self.pattern,
+        }).encode('utf-8')
+        return (self.MAGIC + struct.pack('>I', len(header)) + header
+                + zlib.compress(self.averages.tobytes()))
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserialize a grid written by to_bytes()."""
+        if not data.startswith(cls.MAGIC):
+            raise ValueError("Not a pixel grid")
+        offset = len(cls.MAGIC)
+        (header_size,) = struct.unpack_from('>I', data, offset)
+        offset += 4
+        meta = json.loads(data[offset:offset + header_size])
+        block_size = meta['block_size']
+        shape = ((meta['height'] + block_size - 1) // block_size,
+                 (meta['width'] + block_size - 1) // block_size, 3)
+        averages = np.frombuffer(zlib.decompress(data[offset + header_size:]),
+                                 dtype=np.uint8).reshape(shape)
+        return cls(averages, meta['width'], meta['height'], block_size, meta['pattern'])
+    
+    def save(self, path):
+        """Write the grid to a file."""
+        Path(path).write_bytes(self.to_bytes())
+    
+    @classmethod
+    def load(cls, path):
+        """Read a grid from a file."""
+        return cls.from_bytes(Path(path).read_bytes())
+    
+    def output_size(self, scale=1.0):
+        """
+        Size and block size of a rendering at the given scale.
+        
+        The scaled size is clamped so the grid still covers the canvas with
+        the same number of blocks.
+        
+        Returns:
+            tuple: ``(width, height, block_size)``
+        """
+        block_size = max(1, round(self.block_size * scale))
+        blocks_y, blocks_x = self.averages.shape[:2]
+        width = min(max(round(self.width * scale), (blocks_x - 1) * block_size + 1),
+                    blocks_x * block_size)
+        height = min(max(round(self.height * scale), (blocks_y - 1) * block_size + 1),
+                     blocks_y * block_size)
+        return width, height, block_size
+    
+    def render(self, scale=1.0, pattern=None):
+        """
+        Render the grid to a full image.
+        
+        At scale 1 the result is identical to ImagePixelator.process() on
+        the source image.
+        
+        Args:
+            scale (float): Output size relative to the source image
+            pattern (str): Pattern to draw, defaults to the grid's pattern
+        
+        Returns:
+            PIL.Image: The rendered RGB image
+        """
+        width, height, block_size = self.output_size(scale)
+        pixelator = ImagePixelator(block_size=block_size, pattern=pattern or self.pattern,
+                                   verbose=False)
+        return Image.fromarray(pixelator._render_rows(self.averages, width, 0, height), 'RGB')
+    
+    def save_vector(self, path, scale=1.0, pattern=None):
+        """
+        Write the pattern as an SVG or PDF document.
+        
+        Every "1" cell becomes a filled square on a white page, with
+        touching cells of the same color merged into larger rectangles.
+        The one-pixel overdraw of the raster renderer (see
+        _block_source_maps) is an artifact of drawing on pixels and is not
+        reproduced. The document is written one block row at a time.
+        
+        Args:
+            path: Output path ending in .svg or .pdf
+            scale (float): Document units (pixels for SVG, points for PDF)
+                per source pixel
+            pattern (str): Pattern to draw, defaults to the grid's pattern
+        """
+        suffix = Path(path).suffix.lower()
+        if suffix not in VECTOR_WRITERS:
+            raise ValueError(f"Vector output must be one of: {', '.join(VECTOR_WRITERS)}")
+        pattern = pattern or self.pattern
+        # Validates the pattern
+        ImagePixelator(block_size=self.block_size, pattern=pattern, verbose=False)
+        
+        colors, bands = vector_rects(self.averages, self.width, self.height,
+                                      self.block_size, pattern)
+        with VECTOR_WRITERS[suffix](path, self.width, self.height, colors, scale) as writer:
+            for rects in bands:
+                writer.write(rects)
+
+
+def _pool_context():
+    """
+    Multiprocessing context for render pools, which never forks the caller.
+    
+    Callers such as the GUI render from a worker thread, and forking a
+    process that runs threads can deadlock. A fork server, where available,
+    imports the renderer once and forks workers from that single-threaded
+    process; elsewhere workers are spawned.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['image_pixelator'])
+    return context
+
+
+def _render_strip(block_size, pattern, mask, shape, source_name, target_name, y1, y2):
+    """Render rows ``y1:y2`` between shared memory buffers (worker process)."""
+    # Spawned workers only know the built-in patterns
+    register_pattern(pattern, bitmap=mask, replace=True)
+    source_shm = shared_memory.SharedMemory(name=source_name)
+    target_shm = shared_memory.SharedMemory(name=target_name)
+    try:
+        source = np.ndarray(shape, dtype=np.uint8, buffer=source_shm.buf)
+        target = np.ndarray(shape, dtype=np.uint8, buffer=target_shm.buf)
+        pixelator = ImagePixelator(block_size=block_size, pattern=pattern)
+        
+        # Include the block row above, which can paint the strip's first row
+        top = max(0, y1 - block_size)
+        averages = pixelator._block_averages(source[top:y2])
+        target[y1:y2] = pixelator._render_rows(averages, shape[1], y1, y2, top // block_size)
+        del source, target
+    finally:
+        source_shm.close()
+        target_shm.close()
+
+
+
+def _collect_inputs(inputs):
+    """
+    Expand input arguments into a list of image paths.
+    
+    Args:
+        inputs: File paths, directories and glob patterns
+    
+    Returns:
+        list: Paths in argument order without repeats; missing files are
+        kept so they are reported as failures
+    """
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths.extend(sorted(p for p in path.iterdir()
+                                if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS))
+        elif glob.has_magic(item):
+            paths.extend(sorted(Path(p) for p in glob.glob(item, recursive=True)
+                                if Path(p).is_file()))
+        else:
+            paths.append(path)
+    # A file matched by several arguments is processed once
+    unique = {}
+    for path in paths:
+        unique.setdefault(path.resolve(), path)
+    return list(unique.values())
+
+
+def _pixelate_file(block_sizes, patterns, input_path, output_paths, result_cache=None,
+                   exact=False, fmt=None, encode_options=None):
+    """
+    Pixelate one file for batch mode, raising on any error.
+    
+    Args:
+        output_paths (dict): Output path per ``(block_size, pattern)``
+        fmt, encode_options: Encode settings, see ImagePixelator.encode()
+    
+    Returns:
+        list: The written paths
+    """
+    if len(output_paths) == 1:
+        output_path, = output_paths.values()
+        # Batch mode already runs one image per thread
+        pixelator = ImagePixelator(block_size=block_sizes[0], pattern=patterns[0], workers=1,
+                                   verbose=False, result_cache=result_cache, exact=exact)
+        pixelator._open_image(input_path)
+        if Path(output_path).suffix.lower() in VECTOR_EXTENSIONS:
+            pixelator.save_vector(output_path)
+        elif not pixelator.save_from_cache(output_path, fmt, **encode_options):
+            pixelator.process()
+            pixelator._write_output(output_path, fmt, **encode_options)
+        return [output_path]
+    
+    # One decode for all variants; a downscaled one must suit every size
+    pixelator = ImagePixelator(block_size=reduce(math.gcd, block_sizes), pattern=patterns[0],
+                               verbose=False, exact=exact)
+    pixelator._open_image(input_path)
+    for block_size, pattern, image in pixelator.iter_pyramid(block_sizes, patterns):
+        image.save(output_paths[block_size, pattern], fmt, **encode_options)
+    return list(output_paths.values())
+
+
+def run_batch(input_paths, output_dir, name_template, block_sizes, patterns, concurrency=None,
+              result_cache=None, exact=False, fmt=None, encode_options=None):
+    """
+    Pixelate many images concurrently and print a summary.
+    
+    Images are handled by a thread pool, so decoding, rendering and encoding
+    of different files overlap (PIL and NumPy release the GIL while they
+    work). A failing file is reported and does not stop the batch. With
+    several block sizes or patterns, every image is decoded once and all
+    variants are rendered from it (see ImagePixelator.iter_pyramid).
+    
+    Results keep the input's directory relative to the common directory of
+    all inputs, so ``scans/**/*.png`` does not flatten ``a/x.png`` and
+    ``b/x.png`` onto one name. An input whose output path is still taken by
+    an earlier input is reported as failed instead of overwriting it.
+    
+    Args:
+        input_paths: Image paths to process
+        output_dir: Directory for the results
+        name_template (str): Output file name, formatted with ``stem``,
+            ``suffix``, ``pattern``, ``block_size`` and ``index``
+        block_sizes (list): Block sizes to render every image at
+        patterns (list): Pattern types to render every image with
+        concurrency (int): Images in flight at once, None for one per CPU
+        result_cache (ResultCache): Optional cache of encoded results
+        exact (bool): Never decode JPEGs downscaled
+        fmt (str): Output format, None to go by the file extension
+        encode_options (dict): Encoder settings, see ImagePixelator.encode();
+            with several variants only Pillow's own options are supported
+    
+    Returns:
+        list: ``(input_path, error)`` for every file that failed
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        root = Path(os.path.commonpath([path.parent.resolve() for path in input_paths]))
+    except ValueError:
+        # Inputs on different drives
+        root = None
+    
+    start = time.perf_counter()
+    failures = []
+    targets = {}
+    with ThreadPoolExecutor(max_workers=concurrency or os.cpu_count() or 1) as executor:
+        futures = {}
+        for index, input_path in enumerate(input_paths):
+            subdirectory = input_path.parent.resolve().relative_to(root) if root else Path()
+            output_paths = {
+                (block_size, pattern): output_dir / subdirectory / name_template.format(
+                    stem=input_path.stem, suffix=input_path.suffix, pattern=pattern,
+                    block_size=block_size, index=index)
+                for block_size in block_sizes for pattern in patterns
+            }
+            taken = [path for path in output_paths.values() if path in targets]
+            if taken:
+                failures.append((input_path, ValueError(
+                    f"{taken[0]} is also the output of {targets[taken[0]]}; "
+                    "add {index} or {suffix} to --name-template")))
+                continue
+            for path in output_paths.values():
+                targets[path] = input_path
+                path.parent.mkdir(parents=True, exist_ok=True)
+            future = executor.submit(_pixelate_file, block_sizes, patterns, input_path,
+                                     output_paths, result_cache, exact, fmt,
+                                     encode_options or {})
+            futures[future] = input_path
+        
+        for future in as_completed(futures):
+            try:
+                written = future.result()
+                print(f"✓ {futures[future]} -> "
+                      + (f"{written[0]}" if len(written) == 1 else f"{len(written)} variants"))
+            except Exception as e:
+                failures.append((futures[future], e))
+    
+    elapsed = time.perf_counter() - start
+    done = len(input_paths) - len(failures)
+    print("-" * 50)
+    print(f"📊 {done}/{len(input_paths)} images in {elapsed:.2f}s "
+          f"({done / elapsed if elapsed else 0:.2f} images/sec)")
+    if failures:
+        print(f"✗ {len(failures)} failed:", file=sys.stderr)
+        for input_path, error in failures:
+            print(f"  {input_path}: {error}", file=sys.stderr)
+    return failures
+
+
+def _print_progress(done, total):
+    """Progress callback for the CLI, redrawing one line on stderr."""
+    print(f"\r  Rendering: {done * 100 // total:3d}%", end='\n' if done >= total else '',
+          file=sys.stderr, flush=True)
+
+
+def _load_pattern_modules():
+    """Run --pattern-module arguments ahead of parsing, so -p lists their patterns."""
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument('--pattern-module', action='append', default=[])
+    for source in pre_parser.parse_known_args()[0].pattern_module:
+        try:
+            load_pattern_module(source)
+        except Exception as e:
+            print(f"✗ Error loading pattern module {source}: {e}", file=sys.stderr)
+            sys.exit(1)
+
+
 def main():
     """Main entry point."""
+    _load_pattern_modules()
     parser = argparse.ArgumentParser(
         description='Convert images to pixelated blocks with binary (1/0) patterns',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -144,42 +1720,189 @@ def main():
 Examples:
   python image_pixelator.py input.jpg -b 10 -p checkerboard -o output.jpg
   python image_pixelator.py photo.png -b 15 -p diagonal
+  python image_pixelator.py photos/ "scans/**/*.png" -b 8 --output-dir pixelated
+  python image_pixelator.py photo.jpg -b 4 8 16 32 -p checkerboard diagonal --output-dir sizes
+  python image_pixelator.py photo.jpg -b 16 --palette --png-filter up -o small.png
+  python image_pixelator.py photo.jpg -b 16 --format WEBP --lossless -o output.webp
+  python image_pixelator.py photo.jpg -b 16 --pattern-module my_patterns.py -p dots
         """
     )
     
-    parser.add_argument('input', help='Input image path')
-    parser.add_argument('-b', '--block-size', type=int, default=10,
-                        help='Size of each pixel block (default: 10)')
-    parser.add_argument('-p', '--pattern', default='checkerboard',
-                        choices=['checkerboard', 'diagonal', 'horizontal', 'vertical'],
-                        help='Pattern type (default: checkerboard)')
+    parser.add_argument('inputs', nargs='+', metavar='input',
+                        help='Input image paths, directories or glob patterns')
+    parser.add_argument('-b', '--block-size', type=int, nargs='+', default=[10],
+                        help='Size of each pixel block; several sizes render every '
+                             'variant from one decode (default: 10)')
+    parser.add_argument('-p', '--pattern', nargs='+', type=str.lower, choices=pattern_names(),
+                        help='Pattern type, or several (default: checkerboard)')
+    parser.add_argument('--pattern-module', action='append', metavar='MODULE',
+                        help='Python file or module registering extra patterns with '
+                             'pixelator_patterns.register_pattern (repeatable)')
     parser.add_argument('-o', '--output', help='Output image path (default: output.png)')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Render with N worker processes and compress PNG output on N '
+                             'threads; -j 1 works in-process '
+                             '(default: one per CPU for images of 2 MP and more)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process in horizontal bands to bound memory (PNG/PPM output)')
+    parser.add_argument('--band-height', type=int, default=512,
+                        help='Rows per band in streaming mode (default: 512)')
+    parser.add_argument('--output-dir',
+                        help='Batch mode: directory for the results (default: current directory)')
+    parser.add_argument('--name-template',
+                        help='Batch mode: output file name with {stem}, {suffix}, {pattern}, '
+                             '{block_size} and {index} fields (default: {stem}_{pattern}.png, '
+                             'plus _{block_size} with several block sizes)')
+    parser.add_argument('-c', '--concurrency', type=int,
+                        help='Batch mode: images processed at once (default: one per CPU)')
+    parser.add_argument('--exact', action='store_true',
+                        help='Decode JPEGs at full resolution instead of downscaled '
+                             'when the block size allows it (block sizes from 8; fine '
+                             'texture can then shift block colors by up to about 10 levels)')
+    parser.add_argument('--save-grid', metavar='PATH',
+                        help='Also write the compact block average grid (.pxg) to PATH')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Output scale for .pxg grid inputs and SVG/PDF outputs '
+                             '(default: 1.0)')
+    parser.add_argument('--format', type=str.upper,
+                        help='Output format such as PNG, WEBP or JPEG '
+                             '(default: from the output extension)')
+    parser.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9',
+                        help='PNG zlib level, lower is faster and larger (default: 6)')
+    parser.add_argument('--png-filter', choices=PNG_FILTERS,
+                        help='PNG row filter; "up" suits the repeated rows of large '
+                             'blocks (default: none)')
+    parser.add_argument('--palette', action='store_true',
+                        help='Write an indexed PNG with one palette entry per block color; '
+                             'RGB above 255 colors')
+    parser.add_argument('--quality', type=int, help='JPEG/WEBP quality (1-100)')
+    parser.add_argument('--lossless', action='store_true', help='Lossless WEBP')
+    parser.add_argument('--cache-dir',
+                        help='Reuse results of identical renders from this directory')
+    parser.add_argument('--cache-size-mb', type=int, default=1024,
+                        help='Size cap of the result cache in MB (default: 1024)')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='Write per-stage timings and counters as JSON to PATH')
+    parser.add_argument('--cprofile', metavar='PATH',
+                        help='Run under cProfile and write the stats to PATH '
+                             '(view with python -m pstats PATH)')
     
     args = parser.parse_args()
+    # A .pxg grid carries its own pattern, used unless -p is given
+    pattern_given = args.pattern is not None
+    patterns = list(dict.fromkeys(args.pattern or ['checkerboard']))
+    block_sizes = list(dict.fromkeys(args.block_size))
+    args.pattern, args.block_size = patterns[0], block_sizes[0]
+    extension = f".{args.format.lower()}" if args.format else '.png'
+    name_template = args.name_template or (
+        f"{{stem}}_{{pattern}}_{{block_size}}{extension}" if len(block_sizes) > 1
+        else f"{{stem}}_{{pattern}}{extension}")
+    for values, field in ((block_sizes, '{block_size}'), (patterns, '{pattern}')):
+        if len(values) > 1 and field not in name_template:
+            parser.error(f"--name-template needs a {field} field to tell the variants apart")
+    encode_options = {name: value for name, value in (
+        ('compress_level', args.compress_level), ('png_filter', args.png_filter),
+        ('palette', args.palette), ('quality', args.quality), ('lossless', args.lossless),
+    ) if value not in (None, False)}
+    result_cache = (ResultCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+                    if args.cache_dir else None)
+    
+    # Several inputs, a directory, a glob or several variants switch to batch mode
+    batch = (len(args.inputs) > 1 or args.output_dir is not None
+             or len(block_sizes) > 1 or len(patterns) > 1
+             or any(Path(item).is_dir() or glob.has_magic(item) for item in args.inputs))
+    if batch:
+        if args.output or args.stream or args.profile or args.cprofile:
+            parser.error("-o/--output, --stream and profiling take a single input; "
+                         "use --output-dir")
+        if (len(block_sizes) > 1 or len(patterns) > 1) and (args.palette or args.png_filter):
+            parser.error("--palette and --png-filter take a single block size and pattern")
+        input_paths = _collect_inputs(args.inputs)
+        if not input_paths:
+            print("✗ Error: No input images found", file=sys.stderr)
+            sys.exit(1)
+        
+        print(f"🖼️  Image Pixelator with Binary Pattern Filter")
+        print("-" * 50)
+        failures = run_batch(input_paths, args.output_dir or '.', name_template,
+                             block_sizes, patterns, args.concurrency, result_cache, args.exact,
+                             args.format, encode_options)
+        sys.exit(1 if failures else 0)
     
     # Validate input file
-    input_path = Path(args.input)
+    input_path = Path(args.inputs[0])
     if not input_path.exists():
-        print(f"✗ Error: Input file not found: {args.input}", file=sys.stderr)
+        print(f"✗ Error: Input file not found: {input_path}", file=sys.stderr)
         sys.exit(1)
     
     # Set output path
-    output_path = args.output if args.output else f"output_{args.pattern}.png"
+    animation = not args.stream and is_animation(input_path)
+    if args.output:
+        output_path = args.output
+    elif animation:
+        video = input_path.suffix.lower() in VIDEO_EXTENSIONS
+        output_path = f"output_{args.pattern}{'.mp4' if video else '.gif'}"
+    else:
+        output_path = f"output_{args.pattern}{extension}"
+    if (args.format or encode_options) and (
+            args.stream or animation or Path(output_path).suffix.lower() in VECTOR_EXTENSIONS):
+        parser.error("--format and encode options apply to still raster output only")
+    if args.palette and input_path.suffix.lower() == GRID_EXTENSION:
+        parser.error("--palette needs a source image, not a .pxg grid")
     
     # Create and run pixelator
     print(f"🖼️  Image Pixelator with Binary Pattern Filter")
     print("-" * 50)
     
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler:
+        profiler.enable()
     try:
-        pixelator = ImagePixelator(block_size=args.block_size, pattern=args.pattern)
-        pixelator.load_image(args.input)
-        pixelator.show_info()
-        pixelator.process()
-        pixelator.save(output_path)
+        pixelator = ImagePixelator(block_size=args.block_size, pattern=args.pattern,
+                                   workers=args.jobs, result_cache=result_cache,
+                                   exact=args.exact)
+        if args.stream:
+            pixelator.process_stream(input_path, output_path, band_height=args.band_height,
+                                     progress=_print_progress)
+        elif animation:
+            pixelator.process_animation(input_path, output_path, progress=_print_progress)
+        elif input_path.suffix.lower() == GRID_EXTENSION:
+            grid = PixelGrid.load(input_path)
+            grid_pattern = args.pattern if pattern_given else None
+            if Path(output_path).suffix.lower() in VECTOR_EXTENSIONS:
+                grid.save_vector(output_path, args.scale, pattern=grid_pattern)
+                print(f"✓ Vector image saved: {output_path}")
+            else:
+                pixelator.output = grid.render(args.scale, pattern=grid_pattern)
+                print(f"✓ Grid rendered at {args.scale}x: "
+                      f"{pixelator.output.width}x{pixelator.output.height}")
+                pixelator.save(output_path, args.format, **encode_options)
+        else:
+            pixelator.load_image(input_path)
+            pixelator.show_info()
+            if Path(output_path).suffix.lower() in VECTOR_EXTENSIONS:
+                pixelator.save_vector(output_path, args.scale)
+            elif not pixelator.save_from_cache(output_path, args.format, **encode_options):
+                pixelator.process(progress=_print_progress)
+                pixelator.save(output_path, args.format, **encode_options)
+            if args.save_grid:
+                pixelator.compute_grid().save(args.save_grid)
+                print(f"✓ Grid saved: {args.save_grid}")
+        
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"✓ cProfile stats saved: {args.cprofile}")
+        if args.profile:
+            pixelator.metrics.save(args.profile)
+            for stage, totals in pixelator.metrics.stages.items():
+                print(f"  {stage:<16} {totals['wall'] * 1000:9.1f} ms wall "
+                      f"{totals['cpu'] * 1000:9.1f} ms CPU")
+            print(f"✓ Profile saved: {args.profile}")
         
         print("-" * 50)
         print("✓ Success!")
-        
+    
     except Exception as e:
         print(f"✗ Error: {e}", file=sys.stderr)
         sys.exit(1)
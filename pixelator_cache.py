@@ -0,0 +1,180 @@
+"""
+Image Pixelator Caches
+Content-addressed caches that let repeated renders of the same image skip work.
+"""
+
+from collections import OrderedDict
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+import numpy as np
+
+
+def image_digest(pixels):
+    """
+    Hash decoded pixels, so the same picture matches whatever file it came from.
+    
+    Args:
+        pixels: uint8 array of shape (height, width, 3)
+    
+    Returns:
+        str: Hex digest
+    """
+    pixels = np.ascontiguousarray(pixels)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr(pixels.shape).encode('ascii'))
+    digest.update(pixels.data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of encoded results with a size cap and LRU eviction."""
+    
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        """
+        Initialize the cache.
+        
+        The directory is scanned once here; after that the LRU order and the
+        total size are kept in memory, so a put never walks the directory.
+        
+        Args:
+            directory: Directory holding the cached files, created if missing
+            max_bytes (int): Total size above which least recently used
+                entries are deleted
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        
+        entries = []
+        for path in self.directory.glob('*.bin'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        # The modification time carries the LRU order across restarts
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+    
+    @staticmethod
+    def key(digest, block_size, pattern, fmt):
+        """Build the cache key for one rendering of an image."""
+        return f"{digest}-{block_size}-{pattern}-{fmt.lower()}"
+    
+    def _path(self, key):
+        return self.directory / f"{key}.bin"
+    
+    def _record(self, key, size):
+        """Mark an entry as most recently used (call with the lock held)."""
+        self._bytes -= self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._bytes += size
+    
+    def get(self, key):
+        """
+        Look up an entry.
+        
+        Returns:
+            bytes: Cached data, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+            return None
+        with self._lock:
+            # Entries written by another process join the index on first use
+            self._record(key, len(data))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+    
+    def put(self, key, data):
+        """Store an entry, then evict old entries above the size cap."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # Atomic, so concurrent readers never see a partial file
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._record(key, len(data))
+            self._evict()
+    
+    def _evict(self):
+        """Delete least recently used entries above the cap (call with the lock held)."""
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._path(key).unlink(missing_ok=True)
+    
+    def clear(self):
+        """Delete every entry."""
+        with self._lock:
+            for path in self.directory.glob('*.bin'):
+                path.unlink(missing_ok=True)
+            self._entries.clear()
+            self._bytes = 0
+
+
+class AverageGridCache:
+    """In-memory LRU cache of block average grids, keyed by image and block size."""
+    
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_bytes (int): Total grid size kept in memory
+        """
+        self.max_bytes = max_bytes
+        self._grids = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, digest, block_size):
+        """Return the cached grid or None."""
+        with self._lock:
+            grid = self._grids.get((digest, block_size))
+            if grid is not None:
+                self._grids.move_to_end((digest, block_size))
+            return grid
+    
+    def put(self, digest, block_size, grid):
+        """Store a grid, evicting the least recently used ones above the cap."""
+        if grid.nbytes > self.max_bytes:
+            return
+        grid = grid.copy()
+        grid.setflags(write=False)
+        with self._lock:
+            old = self._grids.pop((digest, block_size), None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._grids[(digest, block_size)] = grid
+            self._bytes += grid.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._grids.popitem(last=False)
+                self._bytes -= evicted.nbytes
+    
+    def clear(self):
+        """Drop every grid."""
+        with self._lock:
+            self._grids.clear()
+            self._bytes = 0
@@ -0,0 +1,780 @@
+"""
+Image Pixelator I/O
+Band-wise decoders and streaming encoders for images, animations and vector output.
+
+Inputs are read a band of rows at a time, straight from the file where the
+format allows it, and outputs are written as rows are rendered, so neither
+side needs the whole image in memory. PIL and OpenCV handle whatever the
+built-in PNG, PPM, APNG, SVG and PDF writers do not.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import struct
+import zlib
+
+import cv2
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageSequence
+
+from pixelator_patterns import pattern_mask
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+# Animation outputs: PIL writes the image formats, OpenCV the videos
+ANIMATED_IMAGE_EXTENSIONS = ('.gif', '.webp', '.png', '.apng')
+VIDEO_CODECS = {'.mp4': 'mp4v', '.mov': 'mp4v', '.avi': 'MJPG', '.mkv': 'XVID'}
+VECTOR_EXTENSIONS = ('.svg', '.pdf')
+# PNG row filters in the order of their filter type byte
+PNG_FILTERS = ('none', 'sub', 'up', 'average', 'paeth')
+
+
+def _raw_tiles(image):
+    """
+    Describe where the pixel rows of an uncompressed image live in its file.
+    
+    Returns:
+        list: ``(y1, y2, offset, stride, bgr, bottom_up)`` per tile, or None
+        if the rows cannot be read directly from the file.
+    """
+    if image.mode != 'RGB':
+        return None
+    tiles = []
+    for tile in image.tile:
+        codec, (x1, y1, x2, y2), offset, args = tile
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, ystep = (tuple(args) + (0, 1))[:3]
+        if codec != 'raw' or rawmode not in ('RGB', 'BGR') or (x1, x2) != (0, image.width):
+            return None
+        tiles.append((y1, y2, offset, stride or image.width * 3, rawmode == 'BGR', ystep < 0))
+    return tiles
+
+
+# TIFF compressions decoded one strip or tile at a time, see _tiff_chunks
+_TIFF_NONE, _TIFF_DEFLATE, _TIFF_ADOBE_DEFLATE, _TIFF_PACKBITS = 1, 32946, 8, 32773
+
+
+def _tiff_chunks(image):
+    """
+    Describe the strips or tiles of an 8-bit RGB TIFF that can be decoded separately.
+    
+    Returns:
+        tuple: ``(chunk_width, chunk_height, rows, compression, predictor)``
+        with rows mapping the top of every row of chunks to its
+        ``(x, offset, size, stored_height)`` list, or None for other images (including LZW and JPEG compression, which
+        have no decoder here outside of libtiff)
+    """
+    if image.format != 'TIFF' or image.mode != 'RGB':
+        return None
+    tags = image.tag_v2
+    compression = tags.get(259, _TIFF_NONE)
+    predictor = tags.get(317, 1)
+    if (compression not in (_TIFF_NONE, _TIFF_DEFLATE, _TIFF_ADOBE_DEFLATE, _TIFF_PACKBITS)
+            or predictor not in (1, 2) or tags.get(284, 1) != 1
+            or tuple(tags.get(258, ())) != (8, 8, 8)):
+        return None
+    rows = {}
+    if 322 in tags:
+        # Tiles are always stored full size, padded past the image edges
+        chunk_width, chunk_height = tags[322], tags[323]
+        across = -(-image.width // chunk_width)
+        for index, (offset, size) in enumerate(zip(tags[324], tags[325])):
+            rows.setdefault(index // across * chunk_height, []).append(
+                (index % across * chunk_width, offset, size, chunk_height))
+    else:
+        # Strips are full width, and the last one may be stored short
+        chunk_width, chunk_height = image.width, min(tags.get(278, image.height), image.height)
+        for index, (offset, size) in enumerate(zip(tags[273], tags[279])):
+            top = index * chunk_height
+            rows[top] = [(0, offset, size, min(chunk_height, image.height - top))]
+    return chunk_width, chunk_height, rows, compression, predictor
+
+
+def _decode_tiff_chunk(data, width, height, compression, predictor):
+    """Decode one strip or tile into a uint8 array of shape (height, width, 3)."""
+    if compression == _TIFF_PACKBITS:
+        return np.asarray(Image.frombytes('RGB', (width, height), data, 'packbits', 'RGB'))
+    if compression != _TIFF_NONE:
+        data = zlib.decompress(data)
+    # The last strip may be stored short
+    rows = np.frombuffer(data, dtype=np.uint8)[:width * height * 3]
+    rows = rows.reshape(-1, width, 3)
+    if predictor == 2:
+        # Horizontal differencing: every sample is stored as the change from its left neighbor
+        rows = np.cumsum(rows, axis=1, dtype=np.uint8)
+    return rows
+
+
+def is_animation(path):
+    """Whether path is a video or an image with more than one frame."""
+    if Path(path).suffix.lower() in VIDEO_EXTENSIONS:
+        return True
+    try:
+        with Image.open(path) as image:
+            return getattr(image, 'n_frames', 1) > 1
+    except OSError:
+        return False
+
+
+def read_frames(path):
+    """
+    Open an animated image or a video for frame-wise reading.
+    
+    Returns:
+        tuple: ``(frame_count, frames)`` where ``frames`` yields
+        ``(pixels, duration_ms)`` with ``pixels`` a uint8 RGB array.
+        frame_count is None when the container does not say.
+    """
+    if Path(path).suffix.lower() in VIDEO_EXTENSIONS:
+        capture = cv2.VideoCapture(str(path))
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25
+        
+        def from_video():
+            try:
+                while True:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 1000 / fps
+            finally:
+                capture.release()
+        
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None, from_video()
+    
+    image = Image.open(path)
+    
+    def from_image():
+        with image:
+            for frame in ImageSequence.Iterator(image):
+                yield np.asarray(frame.convert('RGB')), frame.info.get('duration') or 100
+    
+    return getattr(image, 'n_frames', 1), from_image()
+
+
+def read_bands(image_path, rows_per_band):
+    """
+    Open an image for band-wise reading.
+    
+    Uncompressed rows are read straight from the file and deflate or
+    PackBits TIFFs are decoded one strip or tile at a time. Anything else is
+    decoded whole by PIL, so its memory use is not bounded by the band.
+    
+    Returns:
+        tuple: ``(size, bands, bounded)`` where ``bands`` yields ``(y, rows)``
+        with ``rows`` a uint8 array of shape (band rows, width, 3), and
+        bounded tells whether memory stays proportional to the band height
+    """
+    image = Image.open(image_path)
+    width, height = image.size
+    try:
+        tiles = _raw_tiles(image)
+        chunks = None if tiles else _tiff_chunks(image)
+    except Exception:
+        image.close()
+        raise
+    if tiles or chunks:
+        # Those rows are read from the file directly
+        image.close()
+    
+    def from_file():
+        with open(image_path, 'rb') as f:
+            for y in range(0, height, rows_per_band):
+                y_end = min(y + rows_per_band, height)
+                band = np.empty((y_end - y, width, 3), dtype=np.uint8)
+                for tile_y1, tile_y2, offset, stride, bgr, bottom_up in tiles:
+                    start, stop = max(y, tile_y1), min(y_end, tile_y2)
+                    if start >= stop:
+                        continue
+                    # Rows of a bottom-up tile are stored last row first
+                    first = tile_y2 - stop if bottom_up else start - tile_y1
+                    f.seek(offset + first * stride)
+                    data = np.frombuffer(f.read((stop - start) * stride), dtype=np.uint8)
+                    rows = data.reshape(stop - start, stride)[:, :width * 3]
+                    rows = rows.reshape(stop - start, width, 3)
+                    if bottom_up:
+                        rows = rows[::-1]
+                    if bgr:
+                        rows = rows[:, :, ::-1]
+                    band[start - y:stop - y] = rows
+                yield y, band
+    
+    def from_chunks():
+        chunk_width, chunk_height, layout, compression, predictor = chunks
+        with open(image_path, 'rb') as f:
+            # Decode one row of strips or tiles at a time, then cut it into bands
+            pending = []
+            y = 0
+            for top in range(0, height, chunk_height):
+                row_height = min(chunk_height, height - top)
+                rows = np.empty((row_height, width, 3), dtype=np.uint8)
+                for x, offset, size, stored_height in layout[top]:
+                    f.seek(offset)
+                    tile = _decode_tiff_chunk(f.read(size), chunk_width, stored_height,
+                                              compression, predictor)
+                    right = min(x + chunk_width, width)
+                    rows[:, x:right] = tile[:row_height, :right - x]
+                pending.append(rows)
+                available = sum(len(rows) for rows in pending)
+                while available >= rows_per_band or (available and top + row_height == height):
+                    data = np.concatenate(pending) if len(pending) > 1 else pending[0]
+                    take = min(rows_per_band, available)
+                    yield y, data[:take]
+                    pending = [data[take:]] if take < available else []
+                    available -= take
+                    y += take
+    
+    def from_pil():
+        # Cropping converts one band at a time instead of copying the whole
+        # image; the file is closed once the bands are done or abandoned
+        with image:
+            image.load()
+            for y in range(0, height, rows_per_band):
+                band = image.crop((0, y, width, min(y + rows_per_band, height)))
+                yield y, np.asarray(band if band.mode == 'RGB' else band.convert('RGB'))
+    
+    if tiles:
+        return (width, height), from_file(), True
+    if chunks:
+        return (width, height), from_chunks(), True
+    return (width, height), from_pil(), False
+
+
+def _png_filtered(raw, previous, filter_type, bpp):
+    """Apply one PNG row filter; all predictors use unfiltered bytes, so rows vectorize."""
+    if filter_type == 0:
+        return raw
+    up = np.concatenate([previous[None], raw[:-1]])
+    left = np.zeros_like(raw)
+    left[:, bpp:] = raw[:, :-bpp]
+    if filter_type == 1:
+        return raw - left
+    if filter_type == 2:
+        return raw - up
+    if filter_type == 3:
+        return raw - ((left.astype(np.uint16) + up) // 2).astype(np.uint8)
+    up_left = np.zeros_like(raw)
+    up_left[:, bpp:] = up[:, :-bpp]
+    a, b, c = (x.astype(np.int16) for x in (left, up, up_left))
+    estimate = a + b - c
+    pa, pb, pc = np.abs(estimate - a), np.abs(estimate - b), np.abs(estimate - c)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    return raw - paeth
+
+
+def _png_scanlines(raw, previous, filter_type, bpp):
+    """
+    Filter rows into PNG scanlines, each prefixed with its filter type byte.
+    
+    Args:
+        raw: uint8 rows of shape (n, width * bpp)
+        previous: Unfiltered row above ``raw[0]``, zeros for the first row
+        filter_type (int): Index into PNG_FILTERS, or None to pick sub or up
+            per row by the smallest sum of absolute values, which comes
+            within a few percent of PIL's own filter choice
+        bpp (int): Bytes per pixel
+    
+    Returns:
+        np.ndarray: uint8 array of shape (n, width * bpp + 1)
+    """
+    scanlines = np.empty((len(raw), raw.shape[1] + 1), dtype=np.uint8)
+    if filter_type is None:
+        sub = _png_filtered(raw, previous, 1, bpp)
+        up = _png_filtered(raw, previous, 2, bpp)
+        # Filtered bytes read as signed differences
+        use_up = (np.abs(up.view(np.int8), dtype=np.int16).sum(axis=1)
+                  < np.abs(sub.view(np.int8), dtype=np.int16).sum(axis=1))
+        scanlines[:, 0] = 1 + use_up
+        scanlines[:, 1:] = np.where(use_up[:, None], up, sub)
+    else:
+        scanlines[:, 0] = filter_type
+        scanlines[:, 1:] = _png_filtered(raw, previous, filter_type, bpp)
+    return scanlines
+
+
+def _deflate_band(raw, previous, filter_type, bpp, compress_level):
+    """
+    Filter and compress one band of PNG rows independently (thread pool).
+    
+    The band becomes raw deflate data ending in a full flush, with no
+    history shared with other bands, so bands compressed in any order
+    concatenate into one valid stream.
+    
+    Returns:
+        tuple: ``(deflated, adler32, length)`` of the band's scanlines
+    """
+    data = _png_scanlines(raw, previous, filter_type, bpp).tobytes()
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+    return deflated, zlib.adler32(data), len(data)
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """Adler-32 of two concatenated buffers from their checksums, as zlib's adler32_combine."""
+    base = 65521
+    remainder = length2 % base
+    sum1 = ((adler1 & 0xFFFF) + (adler2 & 0xFFFF) + base - 1) % base
+    sum2 = (remainder * (adler1 & 0xFFFF) + (adler1 >> 16) + (adler2 >> 16)
+            + base - remainder) % base
+    return sum1 | (sum2 << 16)
+
+
+class PngStreamWriter:
+    """Write an RGB or palette PNG one band of rows at a time."""
+    
+    def __init__(self, target, width, height, compress_level=6, png_filter='none', palette=None,
+                 workers=1):
+        """
+        Args:
+            target: Output path or binary file-like object
+            width, height: Image size
+            compress_level (int): zlib level, 0-9
+            png_filter (str): Row filter applied to every row, see PNG_FILTERS,
+                or None to choose sub or up row by row
+            palette: Optional uint8 array of shape (n, 3), n <= 256. Rows are
+                then palette indices of shape (n, width) instead of RGB.
+            workers (int): Threads filtering and compressing bands in
+                parallel; zlib and NumPy release the GIL. Output is then
+                a few hundred bytes larger per band.
+        """
+        if png_filter is not None and png_filter not in PNG_FILTERS:
+            raise ValueError(f"PNG filter must be one of: {', '.join(PNG_FILTERS)}")
+        # Accept a path or an already open binary file-like object
+        self._owns_file = not hasattr(target, 'write')
+        self._file = open(target, 'wb') if self._owns_file else target
+        self._compress_level = compress_level
+        self._compressor = zlib.compressobj(compress_level)
+        self._filter = None if png_filter is None else PNG_FILTERS.index(png_filter)
+        self._bpp = 3 if palette is None else 1
+        # Filters predict from the row above, which is zero for the first row
+        self._previous = np.zeros(width * self._bpp, dtype=np.uint8)
+        self._pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        self._workers = workers
+        self._pending = []
+        self._adler = 1
+        self.bytes_written = 0
+        self._write(b'\x89PNG\r\n\x1a\n')
+        color_type = 2 if palette is None else 3
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+        if palette is not None:
+            self._chunk(b'PLTE', np.ascontiguousarray(palette, dtype=np.uint8).tobytes())
+        if self._pool is not None:
+            # zlib header; the bands follow as raw deflate data
+            self._chunk(b'IDAT', zlib.compress(b'', compress_level)[:2])
+    
+    def _write(self, data):
+        self._file.write(data)
+        self.bytes_written += len(data)
+    
+    def _chunk(self, kind, data):
+        self._write(struct.pack('>I', len(data)) + kind + data)
+        self._write(struct.pack('>I', zlib.crc32(kind + data)))
+    
+    def write(self, rows):
+        """Append rows, uint8 of shape (n, width, 3), or (n, width) for a palette PNG."""
+        raw = rows.reshape(len(rows), -1)
+        previous, self._previous = self._previous, raw[-1].copy()
+        if self._pool is None:
+            data = self._compressor.compress(
+                _png_scanlines(raw, previous, self._filter, self._bpp).tobytes())
+            if data:
+                self._chunk(b'IDAT', data)
+            return
+        
+        self._pending.append(self._pool.submit(_deflate_band, raw, previous, self._filter,
+                                               self._bpp, self._compress_level))
+        # Bound the bands held in memory while keeping every worker busy
+        while len(self._pending) > 2 * self._workers:
+            self._write_band(self._pending.pop(0))
+    
+    def _write_band(self, future):
+        deflated, adler, length = future.result()
+        self._adler = _adler32_combine(self._adler, adler, length)
+        self._chunk(b'IDAT', deflated)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                if self._pool is None:
+                    self._chunk(b'IDAT', self._compressor.flush())
+                else:
+                    while self._pending:
+                        self._write_band(self._pending.pop(0))
+                    # An empty final block, then the checksum of all scanlines
+                    final = zlib.compressobj(self._compress_level, zlib.DEFLATED,
+                                             -zlib.MAX_WBITS).flush()
+                    self._chunk(b'IDAT', final + struct.pack('>I', self._adler))
+                self._chunk(b'IEND', b'')
+        finally:
+            if self._pool is not None:
+                for future in self._pending:
+                    future.cancel()
+                self._pool.shutdown()
+            if self._owns_file:
+                self._file.close()
+
+
+class _PpmStreamWriter:
+    """Write a binary RGB PPM one band of rows at a time."""
+    
+    def __init__(self, path, width, height):
+        self._file = open(path, 'wb')
+        header = f"P6\n{width} {height}\n255\n".encode('ascii')
+        self._file.write(header)
+        self.bytes_written = len(header)
+    
+    def write(self, rows):
+        """Append rows, a uint8 array of shape (n, width, 3)."""
+        data = np.ascontiguousarray(rows).tobytes()
+        self._file.write(data)
+        self.bytes_written += len(data)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+def _changed_region(pixels, previous):
+    """
+    Crop a frame to the rectangle that differs from the previous frame.
+    
+    Returns:
+        tuple: ``(x, y, region)``; the whole frame when previous is None,
+        and a single pixel when nothing changed
+    """
+    if previous is None:
+        return 0, 0, pixels
+    changed = (pixels != previous).any(axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    cols = np.flatnonzero(changed.any(axis=0))
+    if not len(rows):
+        return 0, 0, pixels[:1, :1]
+    y, x = int(rows[0]), int(cols[0])
+    return x, y, pixels[y:rows[-1] + 1, x:cols[-1] + 1]
+
+
+class _ApngStreamWriter(PngStreamWriter):
+    """Write an animated RGB PNG one frame at a time."""
+    
+    def __init__(self, path, width, height, loop=0, compress_level=6):
+        """
+        Args:
+            path: Output path; the file must be seekable to fill in the
+                frame count at the end
+            width, height: Canvas size
+            loop (int): Number of plays, 0 for endless
+            compress_level (int): zlib level, 0-9
+        """
+        super().__init__(path, width, height, compress_level)
+        self._compress_level = compress_level
+        self._loop = loop
+        self._sequence = 0
+        self._last_frame = None
+        self.frames = 0
+        self._actl_offset = self.bytes_written
+        self._chunk(b'acTL', struct.pack('>II', 0, loop))
+    
+    def write(self, pixels, duration):
+        """Append a frame, a uint8 array of shape (height, width, 3), shown for duration ms."""
+        x, y, region = _changed_region(pixels, self._last_frame)
+        self._last_frame = pixels.copy()
+        
+        height, width = region.shape[:2]
+        delay = min(int(round(duration)), 0xFFFF)
+        # Dispose none, blend source: the region overwrites the previous frame
+        self._chunk(b'fcTL', struct.pack('>IIIIIHHBB', self._sequence, width, height, x, y,
+                                         delay, 1000, 0, 0))
+        self._sequence += 1
+        scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+        scanlines[:, 1:] = region.reshape(height, -1)
+        data = zlib.compress(scanlines.tobytes(), self._compress_level)
+        if self.frames == 0:
+            # The first frame doubles as the still image for plain PNG viewers
+            self._chunk(b'IDAT', data)
+        else:
+            self._chunk(b'fdAT', struct.pack('>I', self._sequence) + data)
+            self._sequence += 1
+        self.frames += 1
+    
+    def __exit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                self._chunk(b'IEND', b'')
+                self._file.seek(self._actl_offset)
+                self._chunk(b'acTL', struct.pack('>II', self.frames, self._loop))
+        finally:
+            self._file.close()
+
+
+class _GifStreamWriter:
+    """Write an animated GIF one frame at a time, each frame with its own palette."""
+    
+    def __init__(self, path, loop=0):
+        self._file = open(path, 'wb')
+        self._loop = loop
+        self._last_frame = None
+        self.frames = 0
+    
+    def write(self, pixels, duration):
+        """Append a frame, a uint8 array of shape (height, width, 3), shown for duration ms."""
+        # Later frames only store the rectangle that changed, drawn over the last one
+        x, y, region = _changed_region(pixels, self._last_frame)
+        self._last_frame = pixels.copy()
+        image = Image.fromarray(region, 'RGB').convert('P', palette=Image.Palette.ADAPTIVE)
+        if self.frames == 0:
+            header, _ = GifImagePlugin.getheader(image, info={'loop': self._loop,
+                                                              'duration': duration})
+            self._file.write(b''.join(header))
+        self._file.write(b''.join(GifImagePlugin.getdata(image, (x, y), duration=duration,
+                                                         include_color_table=True)))
+        self.frames += 1
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                self._file.write(b';')
+        finally:
+            self._file.close()
+
+
+class _WebpFrameWriter:
+    """Collect frames for an animated WebP, which PIL can only encode all at once."""
+    
+    def __init__(self, path):
+        self._path = path
+        self._images = []
+        self._durations = []
+    
+    def write(self, pixels, duration):
+        """Append a frame, a uint8 array of shape (height, width, 3), shown for duration ms."""
+        self._images.append(Image.fromarray(pixels, 'RGB'))
+        self._durations.append(duration)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self._images[0].save(self._path, 'WEBP', save_all=True,
+                                 append_images=self._images[1:], duration=self._durations, loop=0)
+        self._images.clear()
+
+
+class _VideoStreamWriter:
+    """Write RGB frames to a video file through OpenCV."""
+    
+    def __init__(self, path, fps, width, height):
+        codec = VIDEO_CODECS[Path(path).suffix.lower()]
+        self._writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*codec), fps,
+                                       (width, height))
+        if not self._writer.isOpened():
+            raise ValueError(f"Cannot write video: {path}")
+    
+    def write(self, pixels, duration):
+        """Append a frame; the frame rate is fixed when the file is opened."""
+        self._writer.write(cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._writer.release()
+
+
+def animation_writer(path, width, height, duration):
+    """Open the frame writer for an animation output, see process_animation()."""
+    suffix = Path(path).suffix.lower()
+    if suffix in VIDEO_CODECS:
+        return _VideoStreamWriter(path, 1000 / duration, width, height)
+    if suffix == '.gif':
+        return _GifStreamWriter(path)
+    if suffix == '.webp':
+        return _WebpFrameWriter(path)
+    return _ApngStreamWriter(path, width, height)
+
+
+STREAM_WRITERS = {'.png': PngStreamWriter, '.ppm': _PpmStreamWriter}
+
+
+def _color_groups(rects):
+    """Color and row count of each run of equal colors in sorted rectangles."""
+    starts = np.flatnonzero(np.diff(rects[:, 0], prepend=-1))
+    counts = np.diff(np.append(starts, len(rects)))
+    return zip(rects[starts, 0].tolist(), counts.tolist())
+
+
+def vector_rects(averages, width, height, block_size, pattern):
+    """
+    Compute the filled rectangles of a vector rendering, block row by block row.
+    
+    "1" cells of one color that touch horizontally are merged into runs,
+    and a run that repeats in the next cell row grows downwards instead of
+    starting a new rectangle, so flat areas and the stripe patterns
+    collapse into few shapes.
+    
+    Returns:
+        tuple: ``(colors, bands)`` where colors is the uint8 palette of
+        shape (n, 3) and bands yields int64 arrays of rows
+        ``(color, x, y, width, height)`` sorted by color
+    """
+    colors, color_index = np.unique(averages.reshape(-1, 3), axis=0, return_inverse=True)
+    color_index = color_index.reshape(averages.shape[:2])
+    
+    cell_size = max(1, block_size // 4)
+    offsets = np.arange(0, block_size, cell_size)
+    cells = offsets // cell_size
+    mask = pattern_mask(pattern)[cells[:, None], cells[None, :]]
+    cell_right = np.minimum(offsets + cell_size, block_size)
+    block_x = np.arange(0, width, block_size)
+    block_right = np.minimum(block_x + block_size, width)
+    
+    def bands():
+        # Runs reaching the current cell row: keys and (color, x0, x1, y0)
+        open_keys = np.empty(0, dtype=np.int64)
+        open_runs = np.empty((0, 4), dtype=np.int64)
+        for block_row, top in enumerate(range(0, height, block_size)):
+            bottom = min(top + block_size, height)
+            closed = []
+            for cell_y, offset in enumerate(offsets):
+                y = top + offset
+                if y >= bottom:
+                    break
+                ones = np.flatnonzero(mask[cell_y])
+                x0 = (block_x[:, None] + offsets[ones][None, :]).ravel()
+                x1 = np.minimum(block_x[:, None] + cell_right[ones][None, :],
+                                block_right[:, None]).ravel()
+                color = np.repeat(color_index[block_row], len(ones))
+                inside = x0 < x1
+                x0, x1, color = x0[inside], x1[inside], color[inside]
+                
+                # Merge touching cells of the same color into runs
+                starts = np.ones(len(x0), dtype=bool)
+                starts[1:] = (x0[1:] != x1[:-1]) | (color[1:] != color[:-1])
+                ends = np.empty_like(starts)
+                ends[:-1] = starts[1:]
+                ends[-1:] = True
+                runs = np.stack([color[starts], x0[starts], x1[ends]], axis=1).astype(np.int64)
+                keys = (runs[:, 0] * (width + 1) + runs[:, 1]) * (width + 1) + runs[:, 2]
+                
+                # Runs missing from this row end; new runs start here
+                continued = np.isin(open_keys, keys)
+                ended = open_runs[~continued]
+                closed.append(np.stack([ended[:, 0], ended[:, 1], ended[:, 3],
+                                        ended[:, 2] - ended[:, 1], y - ended[:, 3]], axis=1))
+                new = ~np.isin(keys, open_keys)
+                open_keys = np.concatenate([open_keys[continued], keys[new]])
+                open_runs = np.concatenate([open_runs[continued],
+                                            np.column_stack([runs[new], np.full(new.sum(), y)])])
+            
+            if bottom == height:
+                closed.append(np.stack([open_runs[:, 0], open_runs[:, 1], open_runs[:, 3],
+                                        open_runs[:, 2] - open_runs[:, 1],
+                                        height - open_runs[:, 3]], axis=1))
+            rects = np.concatenate(closed)
+            yield rects[np.argsort(rects[:, 0], kind='stable')]
+    
+    return colors, bands()
+
+
+class _SvgStreamWriter:
+    """Write an SVG document one group of same-colored rectangles at a time."""
+    
+    def __init__(self, path, width, height, colors, scale=1.0):
+        self._file = open(path, 'w', encoding='ascii')
+        self._file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * scale:g}" '
+            f'height="{height * scale:g}" viewBox="0 0 {width} {height}" '
+            'shape-rendering="crispEdges">\n<style>\n')
+        # One shared style per distinct color
+        for index, (r, g, b) in enumerate(colors.tolist()):
+            self._file.write(f".c{index}{{fill:#{r:02x}{g:02x}{b:02x}}}\n")
+        self._file.write(f'</style>\n<rect width="{width}" height="{height}" fill="#fff"/>\n')
+    
+    def write(self, rects):
+        """Append rectangles, int rows ``(color, x, y, width, height)`` sorted by color."""
+        # One path per color, formatted in a single operation
+        template = ''.join(f'<path class="c{color}" d="' + 'M%d %dh%dv%dh-%dz' * count + '"/>\n'
+                           for color, count in _color_groups(rects))
+        values = np.column_stack([rects[:, 1:], rects[:, 3]])
+        self._file.write(template % tuple(values.ravel().tolist()))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                self._file.write('</svg>\n')
+        finally:
+            self._file.close()
+
+
+class _PdfStreamWriter:
+    """Write a one-page PDF one group of same-colored rectangles at a time."""
+    
+    def __init__(self, path, width, height, colors, scale=1.0):
+        self._file = open(path, 'wb')
+        self._fills = ['%.4g %.4g %.4g rg\n' % (r / 255, g / 255, b / 255)
+                       for r, g, b in colors.tolist()]
+        self._offsets = []
+        self._length = 0
+        self._compressor = zlib.compressobj()
+        
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(b'<< /Type /Catalog /Pages 2 0 R >>')
+        self._object(b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>')
+        self._object(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width * scale:g} '
+                     f'{height * scale:g}] /Contents 4 0 R >>'.encode('ascii'))
+        self._offsets.append(self._file.tell())
+        self._file.write(b'4 0 obj\n<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n')
+        # Flip to a top-down pixel grid and paint the white page
+        self._content(f'{scale:g} 0 0 {-scale:g} 0 {height * scale:g} cm\n'
+                      f'1 1 1 rg 0 0 {width} {height} re f\n')
+    
+    def _object(self, body):
+        self._offsets.append(self._file.tell())
+        self._file.write(b'%d 0 obj\n' % (len(self._offsets)) + body + b'\nendobj\n')
+    
+    def _content(self, text):
+        data = self._compressor.compress(text.encode('ascii'))
+        self._file.write(data)
+        self._length += len(data)
+    
+    def write(self, rects):
+        """Append rectangles, int rows ``(color, x, y, width, height)`` sorted by color."""
+        # Set each fill color once and fill all its rectangles together
+        template = ''.join(self._fills[color] + '%d %d %d %d re\n' * count + 'f\n'
+                           for color, count in _color_groups(rects))
+        self._content(template % tuple(rects[:, 1:].ravel().tolist()))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                data = self._compressor.flush()
+                self._file.write(data + b'\nendstream\nendobj\n')
+                self._object(str(self._length + len(data)).encode('ascii'))
+                xref = self._file.tell()
+                self._file.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(self._offsets) + 1))
+                for offset in self._offsets:
+                    self._file.write(b'%010d 00000 n \n' % offset)
+                self._file.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                                 % (len(self._offsets) + 1, xref))
+        finally:
+            self._file.close()
+
+
+VECTOR_WRITERS = dict(zip(VECTOR_EXTENSIONS, (_SvgStreamWriter, _PdfStreamWriter)))
@@ -0,0 +1,117 @@
+"""
+Image Pixelator Metrics
+Per-stage timings and counters collected while an ImagePixelator works.
+"""
+
+from contextlib import contextmanager
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_memory_mb():
+    """
+    Peak resident set size of this process in MB.
+    
+    This is the high-water mark since the process started, shared by all
+    threads, so in a long-lived process it says nothing about one render.
+    
+    Returns:
+        float: Peak RSS in MB, or None where the platform does not report it
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class PixelatorMetrics:
+    """
+    Wall/CPU time per stage plus work counters.
+    
+    Stages that run several times (e.g. once per band) accumulate. Hooks
+    registered with add_hook() are called after every stage with the stage
+    name and a dict of that run's numbers, so a service can forward them to
+    its own metrics system.
+    
+    CPU time is that of the thread running the stage, so concurrent requests
+    in a threaded server do not count towards each other. It leaves out
+    work handed to other threads or processes: the worker processes of
+    ``render_parallel`` and the PNG compression threads of ``save``.
+    
+    peak_memory_mb is the process-wide peak RSS seen at the end of each stage
+    (see peak_memory_mb()). It is meaningful for one-shot CLI runs; in a
+    long-lived server it only ever grows and covers every earlier request.
+    It is None on platforms without the resource module.
+    """
+    
+    COUNTERS = ('blocks', 'pixels', 'bytes_decoded', 'bytes_encoded')
+    
+    def __init__(self):
+        """Initialize empty metrics."""
+        self.hooks = []
+        self.reset()
+    
+    def reset(self):
+        """Forget everything recorded so far; hooks are kept."""
+        self.stages = {}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.peak_memory_mb = None
+    
+    def add_hook(self, hook):
+        """
+        Register a callback for finished stages.
+        
+        Args:
+            hook: Callable taking ``(stage, record)`` where record has
+                ``wall``, ``cpu`` (of the calling thread) and
+                ``peak_memory_mb`` (process-wide, possibly None)
+        """
+        self.hooks.append(hook)
+    
+    def count(self, name, amount):
+        """Add to a counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+    
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one run of a stage."""
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            record = {
+                'wall': time.perf_counter() - wall,
+                'cpu': time.thread_time() - cpu,
+                'peak_memory_mb': peak_memory_mb(),
+            }
+            totals = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            totals['wall'] += record['wall']
+            totals['cpu'] += record['cpu']
+            totals['calls'] += 1
+            if record['peak_memory_mb'] is not None:
+                self.peak_memory_mb = max(self.peak_memory_mb or 0.0, record['peak_memory_mb'])
+            for hook in self.hooks:
+                hook(name, record)
+    
+    def to_dict(self):
+        """Return the metrics as plain data."""
+        return {
+            'stages': {name: dict(totals) for name, totals in self.stages.items()},
+            'total_wall': sum(totals['wall'] for totals in self.stages.values()),
+            'total_cpu': sum(totals['cpu'] for totals in self.stages.values()),
+            'counters': dict(self.counters),
+            'peak_memory_mb': self.peak_memory_mb,
+        }
+    
+    def save(self, path):
+        """Write the metrics as a JSON report."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,158 @@
+"""
+Image Pixelator Patterns
+Registry of the binary patterns that fill each block, compiled to cell masks.
+
+A block is divided into cells of ``block_size // 4`` pixels, so it never has
+more than 7 cells per side. Every pattern is therefore stored as one small
+boolean mask indexed ``[cell_y, cell_x]``, and renderers look cells up in it
+instead of evaluating the pattern per pixel.
+"""
+
+import hashlib
+import importlib
+import runpy
+
+import numpy as np
+
+
+# Cells per block side covered by a mask; enough for any block size
+MASK_SIZE = 8
+
+_patterns = {}
+_builtin_keys = {}
+
+
+def _bayer_matrix(size):
+    """Ordered-dither threshold map with the values 0 .. size * size - 1."""
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    while len(matrix) < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+_BAYER = _bayer_matrix(MASK_SIZE)
+
+
+def _compile(function=None, bitmap=None, density=None):
+    """Turn one pattern definition into a read-only (MASK_SIZE, MASK_SIZE) mask."""
+    cells = np.arange(MASK_SIZE)
+    if function is not None:
+        try:
+            values = function(cells[None, :], cells[:, None])
+        except (TypeError, ValueError):
+            # Functions written for scalar coordinates
+            values = np.vectorize(function, otypes=[bool])(cells[None, :], cells[:, None])
+        mask = np.broadcast_to(np.asarray(values, dtype=bool), (MASK_SIZE, MASK_SIZE))
+    elif bitmap is not None:
+        rows = np.array([[int(cell) for cell in row] if isinstance(row, str) else row
+                         for row in bitmap])
+        if rows.ndim != 2 or rows.size == 0:
+            raise ValueError("A pattern bitmap needs at least one row of cells")
+        # The bitmap repeats across the block
+        mask = rows[cells[:, None] % rows.shape[0], cells[None, :] % rows.shape[1]] != 0
+    else:
+        if not 0 <= density <= 1:
+            raise ValueError("Pattern density must be between 0 and 1")
+        mask = _BAYER < round(density * MASK_SIZE * MASK_SIZE)
+    
+    mask = np.array(mask, dtype=bool)
+    mask.setflags(write=False)
+    return mask
+
+
+def register_pattern(name, function=None, bitmap=None, density=None, replace=False):
+    """
+    Register a pattern under a name, usable everywhere a pattern is accepted.
+    
+    Exactly one definition is given. Cell coordinates count from the top-left
+    cell of each block, starting at 0.
+    
+    Args:
+        name (str): Pattern name, matched case-insensitively
+        function: Callable ``(x, y) -> bool`` telling whether cell x, y is
+            "1". It is first called once with integer arrays, and cell by
+            cell if it only handles scalars.
+        bitmap: Rows of 0/1 values or strings such as ``'0110'``, tiled
+            across the block
+        density (float): Share of "1" cells from 0 to 1, spread out as an
+            ordered (Bayer) dither
+        replace (bool): Allow replacing an existing pattern of that name
+    
+    Returns:
+        np.ndarray: The compiled mask
+    
+    Raises:
+        ValueError: If the definition is missing, ambiguous or invalid, or
+            the name is taken and replace is False
+    """
+    name = name.lower()
+    if sum(source is not None for source in (function, bitmap, density)) != 1:
+        raise ValueError("Define a pattern by exactly one of function, bitmap or density")
+    if name in _patterns and not replace:
+        raise ValueError(f"Pattern already registered: {name}")
+    mask = _compile(function, bitmap, density)
+    _patterns[name] = mask
+    return mask
+
+
+def unregister_pattern(name):
+    """Remove a pattern; unknown names are ignored."""
+    _patterns.pop(name.lower(), None)
+
+
+def pattern_names():
+    """Registered pattern names in registration order, built-ins first."""
+    return list(_patterns)
+
+
+def pattern_mask(name):
+    """
+    Look up the compiled mask of a pattern.
+    
+    Returns:
+        np.ndarray: Read-only bool array of shape (MASK_SIZE, MASK_SIZE)
+            indexed ``[cell_y, cell_x]``
+    
+    Raises:
+        ValueError: If no pattern of that name is registered
+    """
+    try:
+        return _patterns[name.lower()]
+    except KeyError:
+        raise ValueError(f"Invalid pattern. Choose from: {', '.join(_patterns)}") from None
+
+
+def pattern_key(name):
+    """
+    Identify a pattern by its shape, for cache keys.
+    
+    Built-in patterns keep their plain name. Other patterns get a digest of
+    their mask appended, so that redefining a name never hits results
+    rendered with the old definition.
+    """
+    name = name.lower()
+    mask = pattern_mask(name)
+    if _builtin_keys.get(name) == mask.tobytes():
+        return name
+    return f"{name}.{hashlib.blake2b(mask.tobytes(), digest_size=4).hexdigest()}"
+
+
+def load_pattern_module(source):
+    """
+    Import a module that registers patterns.
+    
+    Args:
+        source (str): Path of a .py file or a dotted module name
+    """
+    if source.endswith('.py'):
+        runpy.run_path(source)
+    else:
+        importlib.import_module(source)
+
+
+register_pattern('checkerboard', function=lambda x, y: (x + y) % 2 == 0)
+register_pattern('diagonal', function=lambda x, y: (x - y) % 2 == 0)
+register_pattern('horizontal', function=lambda x, y: y % 2 == 0)
+register_pattern('vertical', function=lambda x, y: x % 2 == 0)
+_builtin_keys.update((name, mask.tobytes()) for name, mask in _patterns.items())
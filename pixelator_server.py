@@ -0,0 +1,247 @@
+"""
+Image Pixelator HTTP Server
+A long-running pixelation service, so requests skip interpreter startup and imports.
+
+Upload an image as the raw request body:
+    curl --data-binary @photo.jpg "http://localhost:8000/pixelate?block_size=10&pattern=diagonal" -o out.png
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import sys
+import threading
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+from image_pixelator import ImageDecodeError, ImagePixelator
+from pixelator_cache import AverageGridCache
+from pixelator_patterns import load_pattern_module, pattern_names
+
+
+def _image_size(body):
+    """Image dimensions read from the header alone, or None if it cannot be parsed."""
+    try:
+        with Image.open(io.BytesIO(body)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+class PixelatorServer(ThreadingHTTPServer):
+    """HTTP server that renders uploads on a bounded pool of warm workers."""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, workers=None, queue_size=16, max_upload=64 * 1024 * 1024,
+                 band_height=256, average_cache_bytes=256 * 1024 * 1024):
+        """
+        Initialize the server.
+        
+        Args:
+            address: ``(host, port)`` to listen on
+            workers (int): Renders running at once, None for one per CPU
+            queue_size (int): Requests allowed to wait for a worker before
+                new ones are turned away with 503
+            max_upload (int): Largest accepted request body in bytes
+            band_height (int): Rows rendered per streamed PNG chunk
+            average_cache_bytes (int): Memory for block average grids, so a
+                re-upload with another pattern skips averaging
+        """
+        super().__init__(address, PixelatorRequestHandler)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.max_upload = max_upload
+        self.band_height = band_height
+        self.average_cache = AverageGridCache(average_cache_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix='pixelator')
+        # One slot per running or waiting request; when none is free we shed load
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+    
+    def try_acquire(self):
+        """Reserve a render slot without blocking."""
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+    
+    def release(self):
+        """Give a render slot back."""
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+    
+    def server_close(self):
+        """Stop accepting requests and shut the worker pool down."""
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class _ChunkedWriter:
+    """File-like wrapper sending writes as HTTP/1.1 chunks."""
+    
+    def __init__(self, wfile):
+        self._wfile = wfile
+    
+    def write(self, data):
+        if data:
+            self._wfile.write(b'%x\r\n' % len(data) + bytes(data) + b'\r\n')
+    
+    def close(self):
+        self._wfile.write(b'0\r\n\r\n')
+
+
+class PixelatorRequestHandler(BaseHTTPRequestHandler):
+    """Handle ``POST /pixelate`` and ``GET /health``."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        """Report liveness and load."""
+        if urlparse(self.path).path != '/health':
+            self._send_error(404, "Not found")
+            return
+        self._send_json(200, {
+            'status': 'ok',
+            'workers': self.server.workers,
+            'queue_size': self.server.queue_size,
+            'in_flight': self.server.in_flight,
+            'patterns': pattern_names(),
+        })
+    
+    def do_POST(self):
+        """Pixelate the uploaded image and stream the PNG back."""
+        self._streaming = False
+        url = urlparse(self.path)
+        if url.path != '/pixelate':
+            self._send_error(404, "Not found")
+            return
+        
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send_error(411, "Send the image as the request body with a Content-Length")
+            self.close_connection = True
+            return
+        if length > self.server.max_upload:
+            # The body is left unread, so the connection cannot be reused
+            self._send_error(413, f"Upload exceeds {self.server.max_upload} bytes")
+            self.close_connection = True
+            return
+        # Reserve a slot before buffering the upload, so memory is bounded by
+        # the slots and not by the number of open connections
+        if not self.server.try_acquire():
+            self._send_error(503, "Server busy, try again", {'Retry-After': '1'})
+            self.close_connection = True
+            return
+        try:
+            body = self.rfile.read(length)
+            
+            query = parse_qs(url.query)
+            try:
+                pixelator = ImagePixelator(block_size=int(query.get('block_size', ['10'])[0]),
+                                           pattern=query.get('pattern', ['checkerboard'])[0],
+                                           workers=1, verbose=False,
+                                           average_cache=self.server.average_cache)
+            except ValueError as e:
+                self._send_error(400, str(e))
+                return
+            # Blocks larger than the image all render alike; refusing them
+            # keeps a query string from sizing the work
+            size = _image_size(body)
+            if size is not None and pixelator.block_size > max(size):
+                self._send_error(400, f"block_size must be at most {max(size)}, the longer image side")
+                return
+            
+            future = self.server.executor.submit(self._render, pixelator, body)
+            future.result()
+        except Exception as e:
+            # Headers are only out once decoding succeeded
+            if self._streaming:
+                self.close_connection = True
+            elif isinstance(e, ImageDecodeError):
+                self._send_error(400, str(e))
+            else:
+                self._send_error(500, f"Could not process image: {e}")
+        finally:
+            self.server.release()
+    
+    def _render(self, pixelator, body):
+        """Decode, render and stream one upload (runs on a pool worker)."""
+        pixelator.load(body)
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._streaming = True
+        
+        writer = _ChunkedWriter(self.wfile)
+        pixelator.write_png(writer, band_height=self.server.band_height)
+        writer.close()
+    
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {'error': message}, headers)
+    
+    def log_message(self, format, *args):
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description='Serve image pixelation over HTTP',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python pixelator_server.py --port 8000 --workers 4
+  curl --data-binary @photo.jpg "http://localhost:8000/pixelate?block_size=10" -o out.png
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='Concurrent renders (default: one per CPU)')
+    parser.add_argument('-q', '--queue-size', type=int, default=16,
+                        help='Requests waiting for a worker before returning 503 (default: 16)')
+    parser.add_argument('--max-upload-mb', type=int, default=64,
+                        help='Largest accepted upload in MB (default: 64)')
+    parser.add_argument('--pattern-module', action='append', default=[], metavar='MODULE',
+                        help='Python file or module registering extra patterns (repeatable)')
+    args = parser.parse_args()
+    for source in args.pattern_module:
+        load_pattern_module(source)
+    
+    server = PixelatorServer((args.host, args.port), workers=args.workers,
+                             queue_size=args.queue_size,
+                             max_upload=args.max_upload_mb * 1024 * 1024)
+    print(f"🖼️  Image Pixelator server on http://{args.host}:{args.port}")
+    print(f"  Workers: {server.workers}, queue: {server.queue_size}")
+    print(f"  Patterns: {', '.join(pattern_names())}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n✓ Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
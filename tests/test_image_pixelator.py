@@ -0,0 +1,640 @@
+"""
+Equivalence tests for the Image Pixelator renderers.
+
+Every fast path must produce exactly the pixels of process_reference(), the
+original block-by-block ImageDraw renderer, or of process() once that has
+been checked against it.
+"""
+
+import io
+import os
+import re
+import struct
+import threading
+import zlib
+
+import numpy as np
+from PIL import Image, ImageSequence
+import pytest
+
+from image_pixelator import (PNG_FILTERS, ImageDecodeError, ImageEncodeError, ImagePixelator,
+                             InvalidSettingError, PixelatorError, PixelGrid, ProcessingCancelled,
+                             _collect_inputs, _pattern_pixel, run_batch)
+import image_pixelator
+import pixelator_io
+from pixelator_io import read_bands, vector_rects
+import pixelator_patterns
+from pixelator_patterns import pattern_names, register_pattern, unregister_pattern
+
+
+BUILTIN_PATTERNS = ['checkerboard', 'diagonal', 'horizontal', 'vertical']
+
+
+def _random_image(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def _process(pixels, block_size, pattern='checkerboard', **kwargs):
+    pixelator = ImagePixelator(block_size=block_size, pattern=pattern, verbose=False, **kwargs)
+    pixelator.load(pixels)
+    return np.asarray(pixelator.process())
+
+
+def _reference(pixels, block_size, pattern='checkerboard'):
+    pixelator = ImagePixelator(block_size=block_size, pattern=pattern, verbose=False)
+    pixelator.load(pixels)
+    return np.asarray(pixelator.process_reference())
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    """Let the small test images take the process pool path, in several strips."""
+    monkeypatch.setattr(image_pixelator, 'PARALLEL_MIN_PIXELS', 0)
+    monkeypatch.setattr(image_pixelator, 'PROGRESS_BAND_HEIGHT', 32)
+
+
+@pytest.fixture
+def custom_patterns():
+    """Register a function, a bitmap and a density pattern for one test."""
+    def scalar(x, y):
+        # Written for scalars only, so registration falls back to cell by cell
+        if x == y:
+            return True
+        return x == 0
+    
+    register_pattern('test-function', function=scalar)
+    register_pattern('test-bitmap', bitmap=['010', '000'])
+    register_pattern('test-density', density=0.4)
+    yield ['test-function', 'test-bitmap', 'test-density']
+    for name in ('test-function', 'test-bitmap', 'test-density'):
+        unregister_pattern(name)
+
+
+@pytest.mark.parametrize('pattern', BUILTIN_PATTERNS)
+def test_process_matches_reference_for_every_block_size(pattern):
+    # Ragged in both directions for most block sizes, smaller than one block above 37
+    pixels = _random_image(23, 37)
+    for block_size in range(1, 101):
+        assert np.array_equal(_process(pixels, block_size, pattern),
+                              _reference(pixels, block_size, pattern)), block_size
+
+
+@pytest.mark.parametrize('pattern', BUILTIN_PATTERNS)
+@pytest.mark.parametrize('block_size', [1, 2, 3, 4, 5, 7, 8, 10, 13, 16, 25, 33, 64, 100])
+@pytest.mark.parametrize('shape', [(1, 1), (1, 211), (157, 1), (157, 211), (128, 128)])
+def test_process_matches_reference_on_ragged_sizes(pattern, block_size, shape):
+    pixels = _random_image(*shape, seed=block_size)
+    assert np.array_equal(_process(pixels, block_size, pattern),
+                          _reference(pixels, block_size, pattern))
+
+
+def test_source_maps_do_not_grow_with_block_size():
+    for block_size in (1, 7, 100, 8000):
+        assert image_pixelator._block_source_maps('checkerboard', block_size).nbytes <= 4 * 14 * 14
+    # A 10x10 image in one huge block, and several large blocks with ragged edges
+    for pixels, block_size in ((_random_image(10, 10), 8000), (_random_image(301, 517, seed=1), 121),
+                               (_random_image(301, 517, seed=2), 258)):
+        for pattern in BUILTIN_PATTERNS:
+            assert np.array_equal(_process(pixels, block_size, pattern),
+                                  _reference(pixels, block_size, pattern)), (pattern, block_size)
+
+
+def test_builtin_pattern_masks_match_the_original_formulas():
+    formulas = {
+        'checkerboard': lambda x, y: (x + y) % 2 == 0,
+        'diagonal': lambda x, y: (x - y) % 2 == 0,
+        'horizontal': lambda x, y: y % 2 == 0,
+        'vertical': lambda x, y: x % 2 == 0,
+    }
+    cells = np.arange(pixelator_patterns.MASK_SIZE)
+    for name, formula in formulas.items():
+        expected = np.broadcast_to(formula(cells[None, :], cells[:, None]),
+                                   (len(cells), len(cells)))
+        assert np.array_equal(pixelator_patterns.pattern_mask(name), expected), name
+
+
+def test_custom_patterns_match_reference(custom_patterns):
+    assert ImagePixelator(verbose=False).valid_patterns == pattern_names()
+    assert set(custom_patterns) <= set(ImagePixelator(verbose=False).valid_patterns)
+    pixels = _random_image(61, 47, seed=3)
+    for pattern in custom_patterns:
+        for block_size in (1, 2, 3, 4, 5, 7, 9, 11, 16, 25, 33):
+            assert np.array_equal(_process(pixels, block_size, pattern),
+                                  _reference(pixels, block_size, pattern)), (pattern, block_size)
+
+
+def test_reregistered_pattern_does_not_reuse_cached_maps(custom_patterns):
+    pixels = _random_image(64, 64, seed=4)
+    before = _process(pixels, 16, 'test-bitmap')
+    key_before = pixelator_patterns.pattern_key('test-bitmap')
+    register_pattern('test-bitmap', density=0.75, replace=True)
+    after = _process(pixels, 16, 'test-bitmap')
+    assert not np.array_equal(before, after)
+    assert np.array_equal(after, _reference(pixels, 16, 'test-bitmap'))
+    assert pixelator_patterns.pattern_key('test-bitmap') != key_before
+
+
+def test_pattern_registry_validation():
+    with pytest.raises(ValueError):
+        register_pattern('test-empty')
+    with pytest.raises(ValueError):
+        register_pattern('test-both', bitmap=['1'], density=0.5)
+    with pytest.raises(ValueError):
+        register_pattern('test-density', density=2)
+    with pytest.raises(ValueError):
+        register_pattern('checkerboard', density=0.5)
+    with pytest.raises(InvalidSettingError):
+        ImagePixelator(pattern='no-such-pattern')
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+@pytest.mark.parametrize('block_size', [1, 3, 8, 13])
+def test_parallel_matches_serial(always_parallel, workers, block_size):
+    pixels = _random_image(203, 157, seed=5)
+    assert np.array_equal(_process(pixels, block_size, 'horizontal', workers=workers),
+                          _process(pixels, block_size, 'horizontal', workers=1))
+
+
+def test_parallel_with_custom_pattern(always_parallel, custom_patterns):
+    pixels = _random_image(300, 200, seed=6)
+    assert np.array_equal(_process(pixels, 7, 'test-function', workers=3),
+                          _process(pixels, 7, 'test-function', workers=1))
+
+
+def test_parallel_reports_progress_and_cancels_per_strip(always_parallel):
+    pixels = _random_image(320, 50, seed=7)
+    pixelator = ImagePixelator(block_size=8, workers=2, verbose=False)
+    pixelator.load(pixels)
+    reports = []
+    pixelator.process(progress=lambda done, total: reports.append(done))
+    assert len(reports) == 10 and reports[-1] == 320
+    
+    cancel = threading.Event()
+    reports = []
+    
+    def cancel_after_first_strip(done, total):
+        reports.append(done)
+        cancel.set()
+    
+    with pytest.raises(ProcessingCancelled):
+        pixelator.process(progress=cancel_after_first_strip, cancel=cancel)
+    assert len(reports) == 1
+
+
+def test_workers_default_to_cpu_count():
+    assert ImagePixelator(verbose=False).workers == (os.cpu_count() or 1)
+
+
+# Unclosed input files would show up as ResourceWarnings
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('input_format', ['ppm', 'tif', 'bmp', 'png'])
+@pytest.mark.parametrize('output_format', ['png', 'ppm'])
+def test_stream_matches_process(tmp_path, input_format, output_format):
+    pixels = _random_image(203, 157, seed=7)
+    input_path = tmp_path / f"input.{input_format}"
+    output_path = tmp_path / f"output.{output_format}"
+    Image.fromarray(pixels).save(input_path)
+    for block_size in (1, 3, 7, 16):
+        for band_height in (1, 20, 1000):
+            pixelator = ImagePixelator(block_size=block_size, pattern='vertical', verbose=False)
+            pixelator.process_stream(input_path, output_path, band_height=band_height)
+            streamed = np.asarray(Image.open(output_path).convert('RGB'))
+            assert np.array_equal(streamed, _process(pixels, block_size, 'vertical')), \
+                (block_size, band_height)
+
+
+def _write_tiled_tiff(path, pixels, tile_size, predictor=1):
+    """Write a deflate-compressed tiled RGB TIFF, which PIL cannot save."""
+    height, width = pixels.shape[:2]
+    tiles = []
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            tile = np.zeros((tile_size, tile_size, 3), dtype=np.uint8)
+            part = pixels[y:y + tile_size, x:x + tile_size]
+            tile[:len(part), :part.shape[1]] = part
+            if predictor == 2:
+                tile[:, 1:] = tile[:, 1:] - tile[:, :-1]
+            tiles.append(zlib.compress(tile.tobytes()))
+    
+    entries = [(256, 4, 1, width), (257, 4, 1, height), (258, 3, 3, None), (259, 3, 1, 8),
+               (262, 3, 1, 2), (277, 3, 1, 3), (284, 3, 1, 1), (317, 3, 1, predictor),
+               (322, 4, 1, tile_size), (323, 4, 1, tile_size), (324, 4, len(tiles), None),
+               (325, 4, len(tiles), None)]
+    ifd_size = 2 + 12 * len(entries) + 4
+    extra = 8 + ifd_size
+    bits_offset = extra
+    offsets_offset = bits_offset + 6
+    counts_offset = offsets_offset + 4 * len(tiles)
+    data_offset = counts_offset + 4 * len(tiles)
+    tile_offsets = np.cumsum([data_offset] + [len(tile) for tile in tiles[:-1]])
+    
+    ifd = struct.pack('<H', len(entries))
+    for tag, kind, count, value in entries:
+        if tag == 258:
+            value = bits_offset
+        elif tag == 324:
+            value = offsets_offset if len(tiles) > 1 else int(tile_offsets[0])
+        elif tag == 325:
+            value = counts_offset if len(tiles) > 1 else len(tiles[0])
+        packed = struct.pack('<H', value) + b'\0\0' if kind == 3 and count == 1 else \
+            struct.pack('<I', value)
+        ifd += struct.pack('<HHI', tag, kind, count) + packed
+    ifd += struct.pack('<I', 0)
+    with open(path, 'wb') as f:
+        f.write(b'II' + struct.pack('<HI', 42, 8) + ifd + struct.pack('<3H', 8, 8, 8))
+        f.write(struct.pack(f'<{len(tiles)}I', *tile_offsets))
+        f.write(struct.pack(f'<{len(tiles)}I', *[len(tile) for tile in tiles]))
+        f.write(b''.join(tiles))
+
+
+@pytest.mark.parametrize('compression,predictor,rows_per_strip', [
+    ('tiff_adobe_deflate', 1, 16), ('tiff_adobe_deflate', 2, 7), ('tiff_deflate', 1, 1000),
+    ('packbits', 1, 16), ('packbits', 1, 13),
+])
+def test_stream_decodes_compressed_tiff_strips(tmp_path, compression, predictor, rows_per_strip):
+    pixels = _random_image(203, 157, seed=15)
+    # Flat areas give PackBits something to compress
+    pixels[50:120] = pixels[50:120, :1]
+    input_path = tmp_path / 'input.tif'
+    Image.fromarray(pixels).save(input_path, compression=compression,
+                                 tiffinfo={278: rows_per_strip, 317: predictor})
+    for band_height in (1, 20, 1000):
+        _, bands, bounded = read_bands(input_path, band_height)
+        assert bounded
+        assert np.array_equal(np.concatenate([rows for _, rows in bands]), pixels)
+    output_path = tmp_path / 'output.png'
+    ImagePixelator(block_size=7, verbose=False).process_stream(input_path, output_path,
+                                                               band_height=20)
+    assert np.array_equal(np.asarray(Image.open(output_path).convert('RGB')),
+                          _process(pixels, 7))
+
+
+@pytest.mark.parametrize('predictor', [1, 2])
+@pytest.mark.parametrize('shape', [(203, 157), (64, 64), (10, 300)])
+def test_stream_decodes_tiled_tiff(tmp_path, predictor, shape):
+    pixels = _random_image(*shape, seed=16)
+    input_path = tmp_path / 'input.tif'
+    _write_tiled_tiff(input_path, pixels, 32, predictor)
+    assert np.array_equal(np.asarray(Image.open(input_path)), pixels)
+    for band_height in (1, 20, 1000):
+        _, bands, bounded = read_bands(input_path, band_height)
+        assert bounded
+        assert np.array_equal(np.concatenate([rows for _, rows in bands]), pixels)
+
+
+def test_stream_warns_when_input_is_decoded_whole(tmp_path):
+    pixels = _random_image(40, 30, seed=17)
+    input_path = tmp_path / 'input.png'
+    Image.fromarray(pixels).save(input_path)
+    messages = []
+    ImagePixelator(block_size=4, log=messages.append).process_stream(
+        input_path, tmp_path / 'output.png', band_height=8)
+    assert any('not bounded' in message for message in messages)
+    assert np.array_equal(np.asarray(Image.open(tmp_path / 'output.png').convert('RGB')),
+                          _process(pixels, 4))
+
+
+@pytest.mark.parametrize('shape, expected_scale', [
+    ((384, 640), 8),
+    ((392, 648), 2),  # 8-pixel edge blocks allow no more than 1/2
+    ((398, 654), 2),  # 1/2 is the largest scale dividing both sides
+    ((399, 655), 1),
+])
+def test_draft_decode_only_uses_scales_dividing_the_image(shape, expected_scale):
+    height, width = shape
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=-1)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, 'JPEG', quality=90)
+    
+    pixelator = ImagePixelator(block_size=32, verbose=False)
+    pixelator.load(buffer.getvalue())
+    assert pixelator._source_geometry() == (expected_scale, (width, height))
+    
+    exact = _process(Image.open(buffer), 32).astype(int)
+    # Edge blocks included
+    assert np.abs(np.asarray(pixelator.process()).astype(int) - exact).max() <= 3
+
+
+@pytest.mark.parametrize('texture', ['noise', 'sine'])
+def test_draft_decode_error_on_textured_jpegs(texture):
+    height, width = 384, 640
+    y, x = np.mgrid[0:height, 0:width]
+    if texture == 'noise':
+        pixels = _random_image(height, width, seed=9)
+    else:
+        pixels = np.stack([127 + 127 * np.sin(x * 1.3 + y * 0.7), 127 + 127 * np.sin(x * 0.9),
+                           127 + 127 * np.cos(y * 1.7)], axis=-1).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    
+    # The bounds documented for draft_min_block; block size 4 decodes exactly
+    for block_size, scale, limit in ((4, 1, 0), (8, 2, 10), (16, 4, 8), (32, 8, 4), (64, 8, 2)):
+        pixelator = ImagePixelator(block_size=block_size, verbose=False)
+        pixelator.load(buffer.getvalue())
+        assert pixelator._source_geometry()[0] == scale
+        exact = _process(Image.open(buffer), block_size).astype(int)
+        error = np.abs(np.asarray(pixelator.process()).astype(int) - exact).max()
+        assert error <= limit, (block_size, error)
+
+
+def test_grid_renders_like_process(tmp_path):
+    pixels = _random_image(97, 131, seed=8)
+    for block_size in (1, 4, 10, 33):
+        pixelator = ImagePixelator(block_size=block_size, verbose=False)
+        pixelator.load(pixels)
+        grid = PixelGrid.from_bytes(pixelator.compute_grid().to_bytes())
+        assert np.array_equal(np.asarray(grid.render()), _process(pixels, block_size))
+        assert np.array_equal(np.asarray(grid.render(pattern='diagonal')),
+                              _process(pixels, block_size, 'diagonal'))
+
+
+@pytest.mark.parametrize('block_sizes', [[4, 8, 16, 32], [3, 5, 7], [1, 4, 6], [6, 9, 12, 10]])
+def test_pyramid_matches_separate_runs(block_sizes):
+    pixels = _random_image(97, 131, seed=9)
+    pixelator = ImagePixelator(verbose=False)
+    pixelator.load(pixels)
+    for block_size, pattern, image in pixelator.iter_pyramid(block_sizes,
+                                                             ['checkerboard', 'vertical']):
+        assert np.array_equal(np.asarray(image), _process(pixels, block_size, pattern)), \
+            (block_size, pattern)
+
+
+def _write_animation(path):
+    background = _random_image(61, 83, seed=10)
+    frames = []
+    for i in range(6):
+        frame = background.copy()
+        frame[10 + i * 5:30 + i * 5, 5 + i * 7:40 + i * 7] = (255, 0, 0)
+        frames.append(frame)
+    Image.fromarray(frames[0]).save(path, save_all=True, duration=50, loop=0,
+                                    append_images=[Image.fromarray(f) for f in frames[1:]])
+    return frames
+
+
+# GIF frames hold 256 colors, so only sizes with few enough blocks are exact
+@pytest.mark.parametrize('suffix, block_size', [('.png', 1), ('.png', 3), ('.png', 8),
+                                                ('.apng', 5), ('.gif', 8), ('.gif', 16)])
+def test_animation_matches_per_frame_process(tmp_path, suffix, block_size):
+    input_path = tmp_path / 'input.png'
+    output_path = tmp_path / f'output{suffix}'
+    frames = _write_animation(input_path)
+    
+    ImagePixelator(block_size=block_size, verbose=False).process_animation(input_path,
+                                                                           output_path)
+    with Image.open(output_path) as animation:
+        rendered = [(np.asarray(frame.convert('RGB')), frame.info['duration'])
+                    for frame in ImageSequence.Iterator(animation)]
+    assert len(rendered) == len(frames)
+    for frame, (output, duration) in zip(frames, rendered):
+        assert np.array_equal(output, _process(frame, block_size))
+        assert duration == 50
+
+
+@pytest.mark.parametrize('suffix', ['.bmp', '.tif'])
+def test_animation_to_still_format_uses_first_frame(tmp_path, suffix):
+    input_path = tmp_path / 'input.png'
+    frames = _write_animation(input_path)
+    output_path = tmp_path / f'output{suffix}'
+    
+    count = ImagePixelator(block_size=4, verbose=False).process_animation(input_path,
+                                                                          output_path)
+    assert count == 1
+    assert np.array_equal(np.asarray(Image.open(output_path).convert('RGB')),
+                          _process(frames[0], 4))
+
+
+@pytest.mark.parametrize('png_filter', PNG_FILTERS)
+def test_png_encoder_is_lossless(png_filter):
+    pixels = _random_image(97, 131, seed=11)
+    pixelator = ImagePixelator(block_size=5, verbose=False)
+    pixelator.load(pixels)
+    output = np.asarray(pixelator.process())
+    for compress_level in (0, 1, 9):
+        data = pixelator.encode('PNG', png_filter=png_filter, compress_level=compress_level)
+        assert np.array_equal(np.asarray(Image.open(io.BytesIO(data)).convert('RGB')), output)
+
+
+def _png_idat(data):
+    """Concatenated IDAT payloads of a PNG."""
+    chunks, offset = [], 8
+    while offset < len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        if kind == b'IDAT':
+            chunks.append(data[offset + 8:offset + 8 + length])
+        offset += length + 12
+    return b''.join(chunks)
+
+
+@pytest.mark.parametrize('png_filter', PNG_FILTERS + (None,))
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_png_encoder_is_lossless(always_parallel, png_filter, workers):
+    pixels = _random_image(203, 131, seed=11)
+    pixelator = ImagePixelator(block_size=5, workers=workers, verbose=False)
+    pixelator.load(pixels)
+    output = np.asarray(pixelator.process())
+    for compress_level in (0, 6):
+        data = pixelator.encode('PNG', png_filter=png_filter, compress_level=compress_level)
+        # zlib.decompress checks the Adler-32 that PIL ignores
+        assert len(zlib.decompress(_png_idat(data))) == 203 * (131 * 3 + 1)
+        assert np.array_equal(np.asarray(Image.open(io.BytesIO(data)).convert('RGB')), output)
+
+
+def test_adler32_combine_matches_zlib():
+    rng = np.random.default_rng(15)
+    for length1, length2 in [(0, 5), (1, 0), (100, 70000), (65521, 65521), (123457, 3)]:
+        first = rng.integers(0, 256, length1, dtype=np.uint8).tobytes()
+        second = rng.integers(0, 256, length2, dtype=np.uint8).tobytes()
+        assert pixelator_io._adler32_combine(zlib.adler32(first), zlib.adler32(second),
+                                             length2) == zlib.adler32(first + second)
+
+
+@pytest.mark.parametrize('png_filter', PNG_FILTERS)
+@pytest.mark.parametrize('pattern', BUILTIN_PATTERNS)
+def test_palette_png_is_exact_up_to_255_colors(always_parallel, png_filter, pattern):
+    rng = np.random.default_rng(12)
+    pixels = (rng.integers(0, 6, (133, 117, 1)) * 40).repeat(3, axis=2).astype(np.uint8)
+    for workers in (1, 2):
+        pixelator = ImagePixelator(block_size=7, pattern=pattern, workers=workers,
+                                   verbose=False)
+        pixelator.load(pixels)
+        output = np.asarray(pixelator.process())
+        decoded = Image.open(io.BytesIO(pixelator.encode('PNG', palette=True,
+                                                         png_filter=png_filter)))
+        assert decoded.mode == 'P'
+        assert np.array_equal(np.asarray(decoded.convert('RGB')), output)
+
+
+def test_palette_png_above_255_colors_falls_back_to_rgb():
+    messages = []
+    pixelator = ImagePixelator(block_size=2, verbose=False, log=messages.append)
+    pixelator.load(_random_image(64, 64, seed=14))
+    output = np.asarray(pixelator.process())
+    decoded = Image.open(io.BytesIO(pixelator.encode('PNG', palette=True)))
+    assert decoded.mode == 'RGB'
+    assert np.array_equal(np.asarray(decoded), output)
+    assert any('RGB PNG' in message for message in messages)
+
+
+def test_write_png_matches_process():
+    pixels = _random_image(203, 157, seed=13)
+    for block_size in (1, 6, 16):
+        pixelator = ImagePixelator(block_size=block_size, verbose=False)
+        pixelator.load(pixels)
+        buffer = io.BytesIO()
+        pixelator.write_png(buffer, band_height=40)
+        decoded = np.asarray(Image.open(io.BytesIO(buffer.getvalue())).convert('RGB'))
+        assert np.array_equal(decoded, _process(pixels, block_size))
+
+
+def test_library_round_trips():
+    pixels = _random_image(50, 70, seed=14)
+    expected = _process(pixels, 8)
+    pixelator = ImagePixelator(block_size=8, verbose=False)
+    
+    array = pixelator.pixelate(pixels, 'array')
+    assert isinstance(array, np.ndarray) and np.array_equal(array, expected)
+    image = pixelator.pixelate(Image.fromarray(pixels))
+    assert isinstance(image, Image.Image) and np.array_equal(np.asarray(image), expected)
+    
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG')
+    for source in (buffer.getvalue(), io.BytesIO(buffer.getvalue())):
+        data = pixelator.pixelate(source, 'PNG')
+        assert isinstance(data, bytes)
+        assert np.array_equal(np.asarray(Image.open(io.BytesIO(data))), expected)
+
+
+def test_library_errors_are_typed(tmp_path):
+    for source in (b'not an image', io.BytesIO(b''), np.zeros((4, 4), dtype=np.float32)):
+        with pytest.raises(ImageDecodeError):
+            ImagePixelator(verbose=False).pixelate(source, 'PNG')
+    
+    # Every entry point needs an image first
+    pixelator = ImagePixelator(verbose=False)
+    calls = [pixelator.process, pixelator.compute_grid, lambda: next(pixelator.iter_bands()),
+             lambda: next(pixelator.iter_pyramid([4])), lambda: pixelator.write_png(io.BytesIO()),
+             lambda: pixelator.save_vector(tmp_path / 'out.svg'), lambda: pixelator.encode('PNG')]
+    for call in calls:
+        with pytest.raises(PixelatorError) as raised:
+            call()
+        assert type(raised.value) is PixelatorError
+    
+    pixelator.pixelate(_random_image(20, 20))
+    with pytest.raises(ImageEncodeError):
+        pixelator.encode('NO-SUCH-FORMAT')
+    with pytest.raises(InvalidSettingError):
+        pixelator.encode('PNG', png_filter='diagonal')
+    with pytest.raises(InvalidSettingError):
+        pixelator.encode('JPEG', palette=True)
+
+
+def _naive_cells(averages, width, height, block_size, pattern, colors):
+    """Color index per pixel when every "1" cell is painted without bleeding."""
+    cell_size = max(1, block_size // 4)
+    expected = np.full((height, width), -1)
+    for y in range(height):
+        for x in range(width):
+            if _pattern_pixel(pattern, (x % block_size) // cell_size,
+                              (y % block_size) // cell_size):
+                color = averages[y // block_size, x // block_size]
+                expected[y, x] = np.flatnonzero((colors == color).all(axis=1))[0]
+    return expected
+
+
+@pytest.mark.parametrize('pattern', BUILTIN_PATTERNS)
+@pytest.mark.parametrize('block_size', [1, 2, 3, 5, 7, 10, 13])
+def test_vector_rects_cover_each_cell_once(pattern, block_size):
+    rng = np.random.default_rng(block_size)
+    width, height = 37, 29
+    shape = (-(-height // block_size), -(-width // block_size), 3)
+    # Few colors, so neighboring cells merge
+    averages = rng.integers(0, 3, shape, dtype=np.uint8) * 100
+    colors, bands = vector_rects(averages, width, height, block_size, pattern)
+    canvas = np.full((height, width), -1)
+    coverage = np.zeros((height, width), dtype=int)
+    for rects in bands:
+        for color, x, y, w, h in rects:
+            canvas[y:y + h, x:x + w] = color
+            coverage[y:y + h, x:x + w] += 1
+    assert coverage.max() <= 1
+    assert np.array_equal(canvas, _naive_cells(averages, width, height, block_size,
+                                               pattern, colors))
+
+
+def _grid_and_cells(block_size=5, pattern='diagonal'):
+    rng = np.random.default_rng(14)
+    width, height = 43, 31
+    shape = (-(-height // block_size), -(-width // block_size), 3)
+    averages = rng.integers(0, 4, shape, dtype=np.uint8) * 80
+    grid = PixelGrid(averages, width, height, block_size, pattern)
+    colors, _ = vector_rects(averages, width, height, block_size, pattern)
+    expected = _naive_cells(averages, width, height, block_size, pattern, colors)
+    # White where no cell is painted
+    palette = np.concatenate([colors, np.full((1, 3), 255, dtype=np.uint8)])
+    return grid, palette[expected]
+
+
+def test_svg_output_paints_the_cells(tmp_path):
+    grid, expected = _grid_and_cells()
+    path = tmp_path / 'grid.svg'
+    grid.save_vector(path)
+    svg = path.read_text()
+    
+    fills = {f"c{index}": tuple(bytes.fromhex(color))
+             for index, color in re.findall(r'\.c(\d+)\{fill:#([0-9a-f]{6})\}', svg)}
+    canvas = np.full(expected.shape, 255, dtype=np.uint8)
+    for name, data in re.findall(r'<path class="(c\d+)" d="([^"]*)"', svg):
+        for x, y, w, h in re.findall(r'M(\d+) (\d+)h(\d+)v(\d+)h-\d+z', data):
+            x, y, w, h = int(x), int(y), int(w), int(h)
+            canvas[y:y + h, x:x + w] = fills[name]
+    assert np.array_equal(canvas, expected)
+
+
+def test_pdf_output_paints_the_cells(tmp_path):
+    grid, expected = _grid_and_cells()
+    path = tmp_path / 'grid.pdf'
+    grid.save_vector(path)
+    pdf = path.read_bytes()
+    
+    # Every cross-reference entry points at its object
+    xref = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+    count = int(re.match(rb'xref\n0 (\d+)', pdf[xref:]).group(1))
+    offsets = [int(offset) for offset in re.findall(rb'(\d{10}) 00000 n', pdf[xref:])]
+    assert len(offsets) == count - 1
+    for number, offset in enumerate(offsets, 1):
+        assert pdf[offset:].startswith(b'%d 0 obj' % number)
+    
+    start = pdf.index(b'stream\n') + len(b'stream\n')
+    length = int(re.search(rb'5 0 obj\n(\d+)', pdf).group(1))
+    content = zlib.decompress(pdf[start:start + length]).decode('ascii')
+    canvas = np.full(expected.shape, 255, dtype=np.uint8)
+    color = None
+    for line in content.splitlines()[2:]:
+        parts = line.split()
+        if parts[-1] == 'rg':
+            color = [round(float(value) * 255) for value in parts[:3]]
+        elif parts[-1] == 're':
+            x, y, w, h = map(int, parts[:4])
+            canvas[y:y + h, x:x + w] = color
+    assert np.array_equal(canvas, expected)
+
+
+def test_batch_keeps_same_named_inputs_apart(tmp_path):
+    pixels = _random_image(20, 30, seed=18)
+    (tmp_path / 'in' / 'sub').mkdir(parents=True)
+    for name in ('x.png', 'sub/x.png', 'x.jpg'):
+        Image.fromarray(pixels).save(tmp_path / 'in' / name)
+    inputs = _collect_inputs([str(tmp_path / 'in' / '**' / '*.*'), str(tmp_path / 'in')])
+    assert len(inputs) == 3
+    
+    failures = run_batch(inputs, tmp_path / 'out', '{stem}_{pattern}.png', [4], ['checkerboard'])
+    assert (tmp_path / 'out' / 'sub' / 'x_checkerboard.png').exists()
+    assert (tmp_path / 'out' / 'x_checkerboard.png').exists()
+    # x.png and x.jpg still share a name and only the first one is written
+    assert [path.name for path, _ in failures] == ['x.png']
+    
+    assert run_batch(inputs, tmp_path / 'out2', '{stem}{suffix}_{index}.png', [4],
+                     ['checkerboard']) == []
+    assert len(list((tmp_path / 'out2').rglob('*.png'))) == 3
@@ -0,0 +1,42 @@
+import os
+
+from pixelator_cache import ResultCache
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=250)
+    cache.put('a', b'a' * 100)
+    cache.put('b', b'b' * 100)
+    assert cache.get('a') == b'a' * 100
+    cache.put('c', b'c' * 100)
+    
+    assert cache.get('b') is None
+    assert cache.get('a') == b'a' * 100
+    assert cache.get('c') == b'c' * 100
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['a.bin', 'c.bin']
+
+
+def test_result_cache_restores_order_from_disk(tmp_path):
+    for age, key in enumerate(['new', 'old']):
+        path = tmp_path / f"{key}.bin"
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (1000 - age, 1000 - age))
+    
+    cache = ResultCache(tmp_path, max_bytes=250)
+    cache.put('newest', b'y' * 100)
+    
+    assert cache.get('old') is None
+    assert cache.get('new') == b'x' * 100
+    assert cache.get('newest') == b'y' * 100
+
+
+def test_result_cache_replacing_an_entry_keeps_the_size(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=250)
+    for _ in range(5):
+        cache.put('a', b'a' * 100)
+    cache.put('b', b'b' * 100)
+    
+    assert cache.get('a') == b'a' * 100
+    assert cache.get('b') == b'b' * 100
+    cache.clear()
+    assert cache.get('a') is None and list(tmp_path.iterdir()) == []
@@ -0,0 +1,70 @@
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+import image_pixelator
+from pixelator_metrics import PixelatorMetrics
+
+
+def test_stages_accumulate_and_call_hooks():
+    metrics = PixelatorMetrics()
+    records = []
+    metrics.add_hook(lambda stage, record: records.append((stage, record)))
+    for _ in range(3):
+        with metrics.stage('fill'):
+            time.sleep(0.01)
+    with metrics.stage('save'):
+        pass
+    metrics.count('blocks', 5)
+    metrics.count('blocks', 2)
+    
+    assert [stage for stage, _ in records] == ['fill', 'fill', 'fill', 'save']
+    assert set(records[0][1]) == {'wall', 'cpu', 'peak_memory_mb'}
+    fill = metrics.stages['fill']
+    assert fill['calls'] == 3 and fill['wall'] >= 0.03
+    assert fill['wall'] == sum(record['wall'] for stage, record in records if stage == 'fill')
+    
+    report = metrics.to_dict()
+    assert report['counters']['blocks'] == 7
+    assert report['total_wall'] == fill['wall'] + metrics.stages['save']['wall']
+    metrics.reset()
+    assert metrics.stages == {} and len(metrics.hooks) == 1
+
+
+def test_stage_cpu_leaves_out_other_threads():
+    metrics = PixelatorMetrics()
+    done = threading.Event()
+    
+    def spin():
+        while not done.is_set():
+            sum(range(1000))
+    
+    thread = threading.Thread(target=spin)
+    thread.start()
+    try:
+        with metrics.stage('load'):
+            time.sleep(0.3)
+    finally:
+        done.set()
+        thread.join()
+    assert metrics.stages['load']['cpu'] < 0.1
+
+
+def test_cli_profile_writes_json(tmp_path, monkeypatch):
+    source = tmp_path / 'in.png'
+    Image.fromarray(np.zeros((40, 60, 3), dtype=np.uint8)).save(source)
+    report = tmp_path / 'metrics.json'
+    monkeypatch.setattr(sys, 'argv', ['image_pixelator.py', str(source), '-b', '8', '-j', '1',
+                                      '-o', str(tmp_path / 'out.png'), '--profile', str(report)])
+    image_pixelator.main()
+    
+    data = json.loads(report.read_text())
+    assert {'load', 'average', 'fill', 'save'} <= set(data['stages'])
+    assert all(set(totals) == {'wall', 'cpu', 'calls'} for totals in data['stages'].values())
+    assert data['counters']['pixels'] == 40 * 60
+    assert data['counters']['blocks'] == 5 * 8
+    assert data['total_wall'] >= data['stages']['save']['wall']
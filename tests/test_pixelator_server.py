@@ -0,0 +1,86 @@
+import http.client
+import io
+import json
+import threading
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from image_pixelator import ImagePixelator
+from pixelator_patterns import pattern_names
+from pixelator_server import PixelatorServer
+
+
+@pytest.fixture
+def server():
+    """A server on a free local port with one worker and no queue."""
+    server = PixelatorServer(('127.0.0.1', 0), workers=1, queue_size=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, response.getheader('Content-Type'), response.read()
+    finally:
+        connection.close()
+
+
+def _png_upload(height=45, width=70):
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_pixelate_matches_process(server):
+    upload = _png_upload()
+    status, content_type, body = _request(server, 'POST', '/pixelate?block_size=7&pattern=diagonal',
+                                          upload)
+    assert status == 200 and content_type == 'image/png'
+    
+    pixelator = ImagePixelator(block_size=7, pattern='diagonal', verbose=False)
+    pixelator.load(upload)
+    with Image.open(io.BytesIO(body)) as image:
+        assert image.size == (70, 45)
+        assert image.convert('RGB').tobytes() == pixelator.process().tobytes()
+
+
+@pytest.mark.parametrize('query', ['block_size=abc', 'block_size=0', 'pattern=no-such-pattern',
+                                   'block_size=71'])
+def test_bad_params_are_rejected(server, query):
+    status, content_type, body = _request(server, 'POST', f"/pixelate?{query}", _png_upload())
+    assert status == 400 and content_type == 'application/json'
+    assert json.loads(body)['error']
+
+
+def test_undecodable_upload_is_rejected(server):
+    status, _, body = _request(server, 'POST', '/pixelate', b'not an image at all')
+    assert status == 400
+    assert 'Could not read image' in json.loads(body)['error']
+
+
+def test_busy_server_returns_503(server):
+    assert server.try_acquire()
+    try:
+        status, _, _ = _request(server, 'POST', '/pixelate', _png_upload())
+        assert status == 503
+    finally:
+        server.release()
+    assert _request(server, 'POST', '/pixelate', _png_upload())[0] == 200
+
+
+def test_health(server):
+    status, _, body = _request(server, 'GET', '/health')
+    assert status == 200
+    assert json.loads(body) == {'status': 'ok', 'workers': 1, 'queue_size': 0, 'in_flight': 0,
+                                'patterns': pattern_names()}
+    assert _request(server, 'GET', '/nowhere')[0] == 404